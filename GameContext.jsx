@@ -1,4 +1,4 @@
-import React, { createContext, useState, useEffect, useCallback } from 'react';
+import React, { createContext, useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 import {
   RadixDappToolkit,
@@ -86,6 +86,8 @@ export const GameProvider = ({ children }) => {
   const [gatewayApi, setGatewayApi] = useState(null);
   const [isRadixConnected, setIsRadixConnected] = useState(false);
   const [radixWalletData, setRadixWalletData] = useState(null);
+  // Account the server has bound to this player after a signed proof
+  const [boundAccount, setBoundAccount] = useState(null);
 
   // Game resources
   const [tcorvax, setTcorvax] = useState(300.0);
@@ -124,6 +126,10 @@ export const GameProvider = ({ children }) => {
   const [assetsLoaded, setAssetsLoaded] = useState(false);
   const [isMobile, setIsMobile] = useState(false);
 
+  // Last full server state + its version, so reloads only fetch the delta
+  const serverStateRef = useRef(null);
+  const stateVersionRef = useRef(null);
+
   /**************************************************************
    * 1) Initialize the RadixDappToolkit + Gateway
    **************************************************************/
@@ -142,9 +148,10 @@ export const GameProvider = ({ children }) => {
       },
       // request data callback
       (requestData) => {
-        // **Request at least one account** so the user can share their address
+        // Request one account with a signed proof of ownership, so the
+        // server can bind it to this player (see /api/bindWallet)
         requestData(
-          DataRequestBuilder.accounts().atLeast(1)
+          DataRequestBuilder.accounts().exactly(1).withProof()
         );
       },
       {
@@ -164,6 +171,12 @@ export const GameProvider = ({ children }) => {
       }
     );
 
+    // The challenge the wallet signs comes from the server
+    dAppToolkit.walletApi.provideChallengeGenerator(async () => {
+      const resp = await axios.get('/api/rola/challenge');
+      return resp.data.challenge;
+    });
+
     setRdt(dAppToolkit);
 
     // Now create a Gateway client to query ledger if needed
@@ -179,6 +192,8 @@ export const GameProvider = ({ children }) => {
         if (walletData.accounts && walletData.accounts.length > 0) {
           setIsRadixConnected(true);
           setRadixWalletData(walletData);
+          const proof = walletData.proofs?.find((p) => p.type === 'account');
+          if (proof) bindWallet(proof);
         } else {
           // no accounts => user hasn't shared or removed them
           setIsRadixConnected(false);
@@ -195,32 +210,26 @@ export const GameProvider = ({ children }) => {
     };
   }, [rdt]);
 
+  // Send the wallet's signed account proof; the server verifies it and
+  // from then on only uses the bound account
+  const bindWallet = async (proof) => {
+    try {
+      const resp = await axios.post('/api/bindWallet', proof);
+      setBoundAccount(resp.data.account);
+    } catch (err) {
+      console.error('Error binding wallet =>', err);
+    }
+  };
+
   /**************************************************************
    * 2) getStakedCvxBalance => checks user staked CVX
    **************************************************************/
   const getStakedCvxBalance = async () => {
-    if (!isRadixConnected || !gatewayApi || !radixWalletData) return 0;
-    const accounts = radixWalletData.accounts;
-    if (!accounts || accounts.length === 0) return 0;
-
-    const userAccount = accounts[0]; // take the first shared account
+    if (!boundAccount) return 0;
     try {
-      console.log("DEBUG => calling gatewayApi.getEntityFungibleResources...");
-      const response = await gatewayApi.getEntityFungibleResources({
-        address: userAccount.address
-      });
-      console.log("DEBUG => gatewayApi response:", response);
-
-      if (!response || !response.items) {
-        console.warn("No 'items' in response => returning 0");
-        return 0;
-      }
-      // Replace with your real staked CVX resource address
-      const sCvxResourceAddress = 'resource_rdx1t5q4aa74uxcgzehk0u3hjy6kng9rqyr4uvktnud8ehdqaaez50n693';
-      const found = response.items.find(f => f.resourceAddress === sCvxResourceAddress);
-      const balance = found ? parseFloat(found.amount) : 0;
-      console.log("DEBUG => staked CVX =>", balance);
-      return balance;
+      // The server looks the balance of the bound account up (and caches it)
+      const resp = await axios.get('/api/stakedCvx');
+      return parseFloat(resp.data.stakedCvx) || 0;
     } catch (err) {
       console.error('Error fetching staked CVX =>', err);
       return 0;
@@ -234,8 +243,11 @@ export const GameProvider = ({ children }) => {
     try {
       const resp = await axios.get('/api/whoami');
       if (resp.data.loggedIn) {
+        serverStateRef.current = null;
+        stateVersionRef.current = null;
         setIsLoggedIn(true);
         setUserName(resp.data.firstName || 'Player');
+        setBoundAccount(resp.data.radixAccount || null);
         await loadGameFromServer();
       }
     } catch (error) {
@@ -245,12 +257,38 @@ export const GameProvider = ({ children }) => {
 
   const loadGameFromServer = useCallback(async () => {
     try {
-      const resp = await axios.get('/api/getGameState');
-      setTcorvax(parseFloat(resp.data.tcorvax));
-      setCatNips(parseFloat(resp.data.catNips));
-      setEnergy(parseFloat(resp.data.energy));
+      const since = serverStateRef.current ? stateVersionRef.current : null;
+      const resp = await axios.get('/api/getGameState', {
+        params: since !== null ? { since } : {}
+      });
 
-      const newMachines = resp.data.machines.map(m => ({
+      let state;
+      if (resp.data.full === false && serverStateRef.current) {
+        // Delta => merge changed/removed machines + changed balances
+        const prev = serverStateRef.current;
+        const changedIds = new Set(resp.data.machines.map(m => m.id));
+        const removedIds = new Set(resp.data.removedMachineIds);
+        const machines = prev.machines
+          .filter(m => !changedIds.has(m.id) && !removedIds.has(m.id))
+          .concat(resp.data.machines)
+          .sort((a, b) => a.id - b.id);
+        state = { ...prev, ...resp.data.balances, machines };
+      } else {
+        state = {
+          tcorvax: resp.data.tcorvax,
+          catNips: resp.data.catNips,
+          energy: resp.data.energy,
+          machines: resp.data.machines
+        };
+      }
+      serverStateRef.current = state;
+      stateVersionRef.current = resp.data.version ?? null;
+
+      setTcorvax(parseFloat(state.tcorvax));
+      setCatNips(parseFloat(state.catNips));
+      setEnergy(parseFloat(state.energy));
+
+      const newMachines = state.machines.map(m => ({
         ...m,
         particleColor: machineTypes[m.type]?.particleColor
       }));
@@ -263,7 +301,7 @@ export const GameProvider = ({ children }) => {
       });
       setMachineCount(counts);
 
-      setShowLowCorvaxMessage(resp.data.tcorvax < 20 && counts.reactor === 0);
+      setShowLowCorvaxMessage(state.tcorvax < 20 && counts.reactor === 0);
     } catch (error) {
       console.error('Error loading game state:', error);
     }
@@ -399,9 +437,9 @@ export const GameProvider = ({ children }) => {
   const activateMachine = async (machine) => {
     if (!machine) return;
 
-    // If incubator => need wallet connected + shared account
+    // If incubator => need a wallet account bound to this player
     if (machine.type === "incubator") {
-      if (!isRadixConnected || !(radixWalletData?.accounts?.length > 0)) {
+      if (!boundAccount) {
         addNotification(
           "Connect Radix wallet first!",
           machine.x + gridSize,
@@ -413,15 +451,9 @@ export const GameProvider = ({ children }) => {
     }
 
     try {
-      // For incubator => get staked CVX
-      let stakedCvxVal = 0;
-      if (machine.type === "incubator" && !machine.isOffline) {
-        stakedCvxVal = await getStakedCvxBalance();
-      }
-
+      // For incubator => server reads the staked CVX of the bound account
       const resp = await axios.post('/api/activateMachine', {
-        machineId: machine.id,
-        stakedCvx: stakedCvxVal
+        machineId: machine.id
       });
 
       if (resp.data.message) {
@@ -649,6 +681,7 @@ export const GameProvider = ({ children }) => {
         gatewayApi,
         isRadixConnected,
         radixWalletData,
+        boundAccount,
         getStakedCvxBalance
       }}
     >
@@ -1,12 +1,27 @@
 import os
 import time
+import logging
 import hashlib
 import hmac
-import sqlite3
 import random
+import secrets
+import sqlite3
 
 from flask import Flask, request, session, redirect, jsonify, send_from_directory
-from config import BOT_TOKEN, SECRET_KEY, DATABASE_PATH
+from config import (
+    BOT_TOKEN, SECRET_KEY, RADIX_DAPP_DEFINITION, RADIX_EXPECTED_ORIGIN, ROLA_CHALLENGE_TTL,
+)
+from game_rules import (
+    ACTIVATION_COOLDOWN_MS, REACTOR_CATNIP_COST,
+    build_cost, upgrade_cost_for, amplifier_gate_met, incubator_unlocked,
+    settle_amplifier, cat_lair_yield, reactor_yield, incubator_reward,
+)
+from storage import open_storage, retry_on_lock
+from staking import get_staking_service
+from rola import RolaError, verify_account_proof
+from profiling import install_profiler
+from serving import install_load_shedding
+from request_logging import install_request_logging, log
 
 app = Flask(__name__, 
             static_folder='static',  # React build files go here
@@ -18,10 +33,9 @@ app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+install_request_logging(app)
+install_load_shedding(app)
+install_profiler(app)
 
 def verify_telegram_login(query_dict, bot_token):
     their_hash = query_dict.pop("hash", None)
@@ -42,120 +56,93 @@ def serve(path):
         return send_from_directory(app.static_folder, 'index.html')
 
 @app.route("/callback")
+@retry_on_lock
 def telegram_login_callback():
-    print("=== Telegram Callback Called ===")
     args = request.args.to_dict()
-    print(f"Args received: {args}")
-    
+
     user_id = args.get("id")
     tg_hash = args.get("hash")
     auth_date = args.get("auth_date")
     
     if not user_id or not tg_hash or not auth_date:
-        print("Missing login data!")
+        log.warning("telegram login missing fields", extra={"fields": sorted(args)})
         return "<h3>Missing Telegram login data!</h3>", 400
 
     if not verify_telegram_login(args, BOT_TOKEN):
-        print(f"Invalid hash! Data: {args}")
+        log.warning("telegram login hash mismatch", extra={"telegram_id": user_id})
         return "<h3>Invalid hash - data might be forged!</h3>", 403
 
-    print(f"Login successful for user {user_id}")
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    log.info("telegram login ok", extra={"telegram_id": user_id})
 
     try:
         user_id_int = int(user_id)
     except ValueError:
         user_id_int = user_id
 
-    cursor.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id_int,))
-    row = cursor.fetchone()
-    if row is None:
-        first_name = args.get("first_name", "Unknown")
-        print(f"Creating new user: {first_name}")
-        cursor.execute(
-            "INSERT INTO users (user_id, first_name, corvax_count) VALUES (?, ?, 0)",
-            (user_id_int, first_name)
-        )
-        conn.commit()
-
-    cursor.close()
-    conn.close()
+    with open_storage() as store:
+        if store.get_user(user_id_int) is None:
+            first_name = args.get("first_name", "Unknown")
+            log.info("creating user", extra={"telegram_id": user_id_int})
+            store.create_user(user_id_int, first_name)
+            store.commit()
 
     session['telegram_id'] = str(user_id_int)
-    print(f"Session set, redirecting to homepage")
     return redirect("https://test.cvxlab.net/")
 
 @app.route("/api/whoami")
+@retry_on_lock
 def whoami():
     if 'telegram_id' not in session:
         return jsonify({"loggedIn": False}), 200
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT first_name FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    if row:
-        return jsonify({"loggedIn": True, "firstName": row[0]})
+    with open_storage() as store:
+        user = store.get_user(user_id)
+        account = store.get_account(user_id)
+
+    if user:
+        return jsonify({"loggedIn": True, "firstName": user["first_name"], "radixAccount": account})
     else:
-        return jsonify({"loggedIn": True, "firstName": "Unknown"})
+        return jsonify({"loggedIn": True, "firstName": "Unknown", "radixAccount": None})
+
+def machine_to_json(m):
+    return {
+        "id": m["id"],
+        "type": m["machine_type"],
+        "x": m["x"],
+        "y": m["y"],
+        "level": m["level"],
+        "lastActivated": m["last_activated"],
+        "isOffline": m["is_offline"]
+    }
+
+def get_corvax(store, user_id):
+    user = store.get_user(user_id)
+    return user["corvax_count"] if user else 0
 
 @app.route("/api/machines", methods=["GET"])
+@retry_on_lock
 def get_machines():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, machine_type, x, y, level, last_activated, is_offline
-        FROM user_machines
-        WHERE user_id=?
-    """, (user_id,))
-    rows = cur.fetchall()
-
-    machines = []
-    for r in rows:
-        machines.append({
-            "id": r["id"],
-            "type": r["machine_type"],
-            "x": r["x"],
-            "y": r["y"],
-            "level": r["level"],
-            "lastActivated": r["last_activated"],
-            "isOffline": r["is_offline"]
-        })
-
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        machines = [machine_to_json(m) for m in store.list_machines(user_id)]
 
     return jsonify(machines)
 
 @app.route("/api/resources", methods=["GET"])
+@retry_on_lock
 def get_resources():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    tcorvax = row["corvax_count"] if row else 0
-
-    catNips = get_or_create_resource(cur, user_id, 'catNips')
-    energy = get_or_create_resource(cur, user_id, 'energy')
-
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        tcorvax = get_corvax(store, user_id)
+        catNips = store.get_resource(user_id, 'catNips')
+        energy = store.get_resource(user_id, 'energy')
 
     return jsonify({
         "tcorvax": float(tcorvax),
@@ -163,302 +150,108 @@ def get_resources():
         "energy": float(energy)
     })
 
-def get_or_create_resource(cursor, user_id, resource_name):
-    cursor.execute("SELECT amount FROM resources WHERE user_id=? AND resource_name=?", (user_id, resource_name))
-    row = cursor.fetchone()
-    if row is None:
-        cursor.execute("INSERT INTO resources (user_id, resource_name, amount) VALUES (?, ?, 0)",
-                       (user_id, resource_name))
-        return 0
-    else:
-        return row[0]
-
-def set_resource_amount(cursor, user_id, resource_name, amount):
-    cursor.execute("SELECT amount FROM resources WHERE user_id=? AND resource_name=?", (user_id, resource_name))
-    row = cursor.fetchone()
-    if row is None:
-        cursor.execute("INSERT INTO resources (user_id, resource_name, amount) VALUES (?, ?, ?)",
-                       (user_id, resource_name, amount))
-    else:
-        cursor.execute("UPDATE resources SET amount=? WHERE user_id=? AND resource_name=?",
-                       (amount, user_id, resource_name))
-
-def update_amplifiers_status(user_id, conn, cur):
-    cur.execute("""
-        SELECT id, level, is_offline, next_cost_time
-        FROM user_machines
-        WHERE user_id=? AND machine_type='amplifier'
-    """, (user_id,))
-    amps = cur.fetchall()
+def update_amplifiers_status(user_id, store):
+    amps = store.list_machines(user_id, 'amplifier')
     if not amps:
         return
 
     now_ms = int(time.time() * 1000)
-    energy_val = get_or_create_resource(cur, user_id, 'energy')
+    energy_val = store.get_resource(user_id, 'energy')
+    start_energy = energy_val
 
     for amp in amps:
-        amp_id = amp["id"]
-        level = amp["level"]
-        is_offline = amp["is_offline"]
-        next_cost = amp["next_cost_time"]
-
-        if next_cost == 0:
-            next_cost = now_ms + 24*60*60*1000
-            cur.execute("""
-                UPDATE user_machines
-                SET next_cost_time=?
-                WHERE user_id=? AND id=?
-            """, (next_cost, user_id, amp_id))
-            conn.commit()
-
-        cost = 2 * level
-        if is_offline == 0:
-            while next_cost <= now_ms:
-                if energy_val >= cost:
-                    energy_val -= cost
-                    set_resource_amount(cur, user_id, 'energy', energy_val)
-                    next_cost += 24*60*60*1000
-                else:
-                    is_offline = 1
-                    cur.execute("""
-                        UPDATE user_machines
-                        SET is_offline=1
-                        WHERE user_id=? AND id=?
-                    """, (user_id, amp_id))
-                    conn.commit()
-                    break
-        else:
-            if next_cost <= now_ms:
-                if energy_val >= cost:
-                    energy_val -= cost
-                    set_resource_amount(cur, user_id, 'energy', energy_val)
-                    next_cost = now_ms + 24*60*60*1000
-                    is_offline = 0
-                    cur.execute("""
-                        UPDATE user_machines
-                        SET is_offline=0, next_cost_time=?
-                        WHERE user_id=? AND id=?
-                    """, (next_cost, user_id, amp_id))
-                    conn.commit()
-                else:
-                    pass
-
-        cur.execute("""
-            UPDATE user_machines
-            SET next_cost_time=?, is_offline=?
-            WHERE user_id=? AND id=?
-        """, (next_cost, is_offline, user_id, amp_id))
-        conn.commit()
+        is_offline, next_cost, energy_val = settle_amplifier(
+            amp["level"], amp["is_offline"], amp["next_cost_time"], energy_val, now_ms
+        )
+        if (is_offline, next_cost) != (amp["is_offline"], amp["next_cost_time"]):
+            store.update_machine(user_id, amp["id"], next_cost_time=next_cost, is_offline=is_offline)
+
+    if energy_val != start_energy:
+        store.set_resource(user_id, 'energy', energy_val)
+    store.commit()
 
 @app.route("/api/getGameState", methods=["GET"])
+@retry_on_lock
 def get_game_state():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
 
+    since = request.args.get("since", type=int)
+
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    update_amplifiers_status(user_id, conn, cur)
-
-    cur.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    tcorvax = row["corvax_count"] if row else 0
-
-    catNips = get_or_create_resource(cur, user_id, 'catNips')
-    energy = get_or_create_resource(cur, user_id, 'energy')
-
-    cur.execute("""
-        SELECT id, machine_type, x, y, level, last_activated, is_offline
-        FROM user_machines
-        WHERE user_id=?
-    """, (user_id,))
-    rows = cur.fetchall()
-
-    machines = []
-    for r in rows:
-        machines.append({
-            "id": r["id"],
-            "type": r["machine_type"],
-            "x": r["x"],
-            "y": r["y"],
-            "level": r["level"],
-            "lastActivated": r["last_activated"],
-            "isOffline": r["is_offline"]
-        })
-
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        update_amplifiers_status(user_id, store)
+
+        state = store.get_state_version(user_id) or {"version": 0, "floor": 0}
+        version = state["version"]
+
+        # A delta is only possible from a version this player has actually
+        # seen and whose removals are still on record.
+        if since is not None and state["floor"] <= since <= version:
+            changes = store.changes_since(user_id, since)
+            balances = {name: float(v) for name, v in changes["balances"].items()}
+            # The three balances always go out: the Telegram bot writes to
+            # bot.db directly, without stamping a version.
+            balances["tcorvax"] = float(get_corvax(store, user_id))
+            balances["catNips"] = float(store.get_resource(user_id, 'catNips'))
+            balances["energy"] = float(store.get_resource(user_id, 'energy'))
+            return jsonify({
+                "full": False,
+                "version": version,
+                "machines": [machine_to_json(m) for m in changes["machines"]],
+                "removedMachineIds": changes["removed"],
+                "balances": balances
+            })
+
+        tcorvax = get_corvax(store, user_id)
+        catNips = store.get_resource(user_id, 'catNips')
+        energy = store.get_resource(user_id, 'energy')
+        machines = [machine_to_json(m) for m in store.list_machines(user_id)]
 
     return jsonify({
+        "full": True,
+        "version": version,
         "tcorvax": float(tcorvax),
         "catNips": float(catNips),
         "energy": float(energy),
         "machines": machines
     })
 
-def build_cost(machine_type, how_many_already):
-    if machine_type == "catLair":
-        if how_many_already == 0:
-            return {"tcorvax": 10}
-        elif how_many_already == 1:
-            return {"tcorvax": 40}
-        else:
-            return None
-
-    elif machine_type == "reactor":
-        if how_many_already == 0:
-            return {"tcorvax": 10, "catNips": 10}
-        elif how_many_already == 1:
-            return {"tcorvax": 40, "catNips": 40}
-        else:
-            return None
-
-    elif machine_type == "amplifier":
-        if how_many_already == 0:
-            return {"tcorvax": 10, "catNips": 10, "energy": 10}
-        else:
-            return None
-            
-    elif machine_type == "incubator":
-        if how_many_already == 0:
-            return {"tcorvax": 320, "catNips": 320, "energy": 320}
-        else:
-            return None
-
-    return None
-
-def is_second_machine(cur, user_id, machine_type, machine_id):
-    cur.execute("""
-        SELECT id FROM user_machines
-        WHERE user_id=? AND machine_type=?
-        ORDER BY id
-    """, (user_id, machine_type))
-    machine_ids = [row["id"] for row in cur.fetchall()]
+def is_second_machine(store, user_id, machine_type, machine_id):
+    machine_ids = [m["id"] for m in store.list_machines(user_id, machine_type)]
     if machine_id not in machine_ids:
         return False
     index = machine_ids.index(machine_id)
     return (index == 1)
 
-def are_first_machine_lvl3(cur, user_id, mtype):
-    cur.execute("""
-        SELECT level FROM user_machines
-        WHERE user_id=? AND machine_type=?
-        ORDER BY id
-        LIMIT 1
-    """, (user_id, mtype))
-    r = cur.fetchone()
-    if r and r["level"] >= 3:
-        return True
-    return False
-
-def are_two_machines_lvl3(cur, user_id, mtype):
-    cur.execute("""
-        SELECT level FROM user_machines
-        WHERE user_id=? AND machine_type=?
-        ORDER BY id
-    """, (user_id, mtype))
-    rows = cur.fetchall()
-    if len(rows) < 2:
-        return False
-    if rows[0]["level"] >=3 and rows[1]["level"] >=3:
-        return True
-    return False
+def machine_levels(store, user_id, mtype):
+    return [m["level"] for m in store.list_machines(user_id, mtype)]
 
-def check_amplifier_gating(cur, user_id, next_level):
-    if next_level == 4:
-        if not are_first_machine_lvl3(cur, user_id, "catLair"):
-            return False
-        if not are_first_machine_lvl3(cur, user_id, "reactor"):
-            return False
-        return True
-    elif next_level == 5:
-        if not are_two_machines_lvl3(cur, user_id, "catLair"):
-            return False
-        if not are_two_machines_lvl3(cur, user_id, "reactor"):
-            return False
-        return True
-    return True
+def check_amplifier_gating(store, user_id, next_level):
+    return amplifier_gate_met(
+        next_level,
+        machine_levels(store, user_id, "catLair"),
+        machine_levels(store, user_id, "reactor")
+    )
 
-def can_build_incubator(cur, user_id):
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type='catLair'
-    """, (user_id,))
-    total_cat_lairs = cur.fetchone()[0]
-    if total_cat_lairs == 0:
-        return False
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type='catLair' AND level=3
-    """, (user_id,))
-    max_level_cat_lairs = cur.fetchone()[0]
-    if max_level_cat_lairs < total_cat_lairs:
-        return False
-
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type='reactor'
-    """, (user_id,))
-    total_reactors = cur.fetchone()[0]
-    if total_reactors == 0:
-        return False
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type='reactor' AND level=3
-    """, (user_id,))
-    max_level_reactors = cur.fetchone()[0]
-    if max_level_reactors < total_reactors:
-        return False
+def can_build_incubator(store, user_id):
+    return incubator_unlocked(
+        machine_levels(store, user_id, "catLair"),
+        machine_levels(store, user_id, "reactor"),
+        machine_levels(store, user_id, "amplifier")
+    )
 
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type='amplifier' AND level=5
-    """, (user_id,))
-    max_level_amplifier = cur.fetchone()[0]
-    if max_level_amplifier == 0:
-        return False
-
-    return True
-
-def upgrade_cost(cur, user_id, machine_type, current_level, machine_id):
+def upgrade_cost(store, user_id, machine_type, current_level, machine_id):
     next_level = current_level + 1
-    if machine_type in ("catLair","reactor"):
-        if next_level > 3:
-            return None
-    elif machine_type == "amplifier":
-        if next_level > 5:
-            return None
-        if not check_amplifier_gating(cur, user_id, next_level):
-            return None
-    else:
-        return None
-
     if machine_type == "amplifier":
-        if not check_amplifier_gating(cur, user_id, next_level):
+        if not check_amplifier_gating(store, user_id, next_level):
             return None
 
-    if machine_type == "catLair":
-        base_for_level1 = {"tcorvax": 10}
-    elif machine_type == "reactor":
-        base_for_level1 = {"tcorvax":10, "catNips":10}
-    elif machine_type == "amplifier":
-        base_for_level1 = {"tcorvax":10, "catNips":10, "energy":10}
-    else:
-        return None
-
-    second = is_second_machine(cur, user_id, machine_type, machine_id)
-    mult = 2 ** (next_level - 1)
-    cost_out = {}
-    for res, val in base_for_level1.items():
-        c = val * mult
-        if second and (machine_type in ["catLair","reactor"]):
-            c *= 4
-        cost_out[res] = c
-
-    return cost_out
+    second = is_second_machine(store, user_id, machine_type, machine_id)
+    return upgrade_cost_for(machine_type, next_level, second)
 
 @app.route("/api/buildMachine", methods=["POST"])
+@retry_on_lock
 def build_machine():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
@@ -469,85 +262,55 @@ def build_machine():
     y_coord = data.get("y", 0)
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    update_amplifiers_status(user_id, conn, cur)
-
-    cur.execute("""
-        SELECT COUNT(*) FROM user_machines
-        WHERE user_id=? AND machine_type=?
-    """, (user_id, machine_type))
-    how_many = cur.fetchone()[0]
-
-    cost_dict = build_cost(machine_type, how_many)
-    if cost_dict is None:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Cannot build more of this machine type."}), 400
-
-    if machine_type == "incubator":
-        if not can_build_incubator(cur, user_id):
-            cur.close()
-            conn.close()
-            return jsonify({"error": "All machines must be at max level to build Incubator."}), 400
-
-    cur.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
-    tcorvax_val = float(row["corvax_count"])
-    catNips_val = float(get_or_create_resource(cur, user_id, 'catNips'))
-    energy_val  = float(get_or_create_resource(cur, user_id, 'energy'))
-
-    if (tcorvax_val < cost_dict.get("tcorvax",0) or
-        catNips_val < cost_dict.get("catNips",0) or
-        energy_val < cost_dict.get("energy",0)):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Not enough resources"}), 400
-
-    machine_size = 128
-    max_x = 800 - machine_size
-    max_y = 600 - machine_size
-    if x_coord < 0 or x_coord > max_x or y_coord < 0 or y_coord > max_y:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Cannot build outside map boundaries."}), 400
-
-    cur.execute("SELECT x, y FROM user_machines WHERE user_id=?", (user_id,))
-    all_m = cur.fetchall()
-    for m in all_m:
-        dx = abs(m["x"] - x_coord)
-        dy = abs(m["y"] - y_coord)
-        if dx < machine_size and dy < machine_size:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "Cannot build here!"}), 400
-
-    tcorvax_val -= cost_dict.get("tcorvax",0)
-    catNips_val -= cost_dict.get("catNips",0)
-    energy_val  -= cost_dict.get("energy",0)
-
-    cur.execute("""
-        UPDATE users SET corvax_count=?
-        WHERE user_id=?
-    """, (tcorvax_val, user_id))
-    set_resource_amount(cur, user_id, 'catNips', catNips_val)
-    set_resource_amount(cur, user_id, 'energy', energy_val)
-
-    is_offline = 1 if machine_type == "incubator" else 0
-    cur.execute("""
-        INSERT INTO user_machines
-        (user_id, machine_type, x, y, level, last_activated, is_offline, next_cost_time)
-        VALUES (?, ?, ?, ?, 1, 0, ?, 0)
-    """, (user_id, machine_type, x_coord, y_coord, is_offline))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        update_amplifiers_status(user_id, store)
+
+        how_many = store.count_machines(user_id, machine_type)
+
+        cost_dict = build_cost(machine_type, how_many)
+        if cost_dict is None:
+            return jsonify({"error": "Cannot build more of this machine type."}), 400
+
+        if machine_type == "incubator":
+            if not can_build_incubator(store, user_id):
+                return jsonify({"error": "All machines must be at max level to build Incubator."}), 400
+
+        user = store.get_user(user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        tcorvax_val = float(user["corvax_count"])
+        catNips_val = float(store.get_resource(user_id, 'catNips'))
+        energy_val  = float(store.get_resource(user_id, 'energy'))
+
+        if (tcorvax_val < cost_dict.get("tcorvax",0) or
+            catNips_val < cost_dict.get("catNips",0) or
+            energy_val < cost_dict.get("energy",0)):
+            return jsonify({"error": "Not enough resources"}), 400
+
+        machine_size = 128
+        max_x = 800 - machine_size
+        max_y = 600 - machine_size
+        if x_coord < 0 or x_coord > max_x or y_coord < 0 or y_coord > max_y:
+            return jsonify({"error": "Cannot build outside map boundaries."}), 400
+
+        for m in store.list_machines(user_id):
+            dx = abs(m["x"] - x_coord)
+            dy = abs(m["y"] - y_coord)
+            if dx < machine_size and dy < machine_size:
+                return jsonify({"error": "Cannot build here!"}), 400
+
+        tcorvax_val -= cost_dict.get("tcorvax",0)
+        catNips_val -= cost_dict.get("catNips",0)
+        energy_val  -= cost_dict.get("energy",0)
+
+        store.set_corvax(user_id, tcorvax_val)
+        store.set_resource(user_id, 'catNips', catNips_val)
+        store.set_resource(user_id, 'energy', energy_val)
+
+        is_offline = 1 if machine_type == "incubator" else 0
+        store.add_machine(user_id, machine_type, x_coord, y_coord, is_offline=is_offline)
+
+        store.commit()
 
     return jsonify({
         "status": "ok",
@@ -560,6 +323,7 @@ def build_machine():
     })
 
 @app.route("/api/upgradeMachine", methods=["POST"])
+@retry_on_lock
 def upgrade_machine():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
@@ -570,71 +334,45 @@ def upgrade_machine():
         return jsonify({"error": "Missing machineId"}), 400
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    update_amplifiers_status(user_id, conn, cur)
-
-    cur.execute("""
-        SELECT id, machine_type, level
-        FROM user_machines
-        WHERE user_id=? AND id=?
-    """, (user_id, machine_id))
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Machine not found"}), 404
-
-    machine_type = row["machine_type"]
-    current_level = row["level"]
-
-    cost_dict = upgrade_cost(cur, user_id, machine_type, current_level, machine_id)
-    if cost_dict is None:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Cannot upgrade further or gating not met."}), 400
-
-    cur.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id,))
-    urow = cur.fetchone()
-    if not urow:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
-
-    tcorvax_val = float(urow["corvax_count"])
-    catNips_val = float(get_or_create_resource(cur, user_id, 'catNips'))
-    energy_val  = float(get_or_create_resource(cur, user_id, 'energy'))
-
-    if (tcorvax_val < cost_dict.get("tcorvax",0) or
-        catNips_val < cost_dict.get("catNips",0) or
-        energy_val < cost_dict.get("energy",0)):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Not enough resources"}), 400
-
-    new_level = current_level + 1
-    cur.execute("""
-        UPDATE user_machines
-        SET level=?
-        WHERE user_id=? AND id=?
-    """, (new_level, user_id, machine_id))
-
-    tcorvax_val -= cost_dict.get("tcorvax",0)
-    catNips_val -= cost_dict.get("catNips",0)
-    energy_val  -= cost_dict.get("energy",0)
-
-    cur.execute("""
-        UPDATE users
-        SET corvax_count=?
-        WHERE user_id=?
-    """, (tcorvax_val, user_id))
-    set_resource_amount(cur, user_id, 'catNips', catNips_val)
-    set_resource_amount(cur, user_id, 'energy', energy_val)
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        update_amplifiers_status(user_id, store)
+
+        machine = store.get_machine(user_id, machine_id)
+        if not machine:
+            return jsonify({"error": "Machine not found"}), 404
+
+        machine_type = machine["machine_type"]
+        current_level = machine["level"]
+
+        cost_dict = upgrade_cost(store, user_id, machine_type, current_level, machine_id)
+        if cost_dict is None:
+            return jsonify({"error": "Cannot upgrade further or gating not met."}), 400
+
+        user = store.get_user(user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        tcorvax_val = float(user["corvax_count"])
+        catNips_val = float(store.get_resource(user_id, 'catNips'))
+        energy_val  = float(store.get_resource(user_id, 'energy'))
+
+        if (tcorvax_val < cost_dict.get("tcorvax",0) or
+            catNips_val < cost_dict.get("catNips",0) or
+            energy_val < cost_dict.get("energy",0)):
+            return jsonify({"error": "Not enough resources"}), 400
+
+        new_level = current_level + 1
+        store.update_machine(user_id, machine_id, level=new_level)
+
+        tcorvax_val -= cost_dict.get("tcorvax",0)
+        catNips_val -= cost_dict.get("catNips",0)
+        energy_val  -= cost_dict.get("energy",0)
+
+        store.set_corvax(user_id, tcorvax_val)
+        store.set_resource(user_id, 'catNips', catNips_val)
+        store.set_resource(user_id, 'energy', energy_val)
+
+        store.commit()
 
     return jsonify({
         "status": "ok",
@@ -648,6 +386,7 @@ def upgrade_machine():
     })
 
 @app.route("/api/activateMachine", methods=["POST"])
+@retry_on_lock
 def activate_machine():
     if 'telegram_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
@@ -658,152 +397,110 @@ def activate_machine():
         return jsonify({"error": "Missing machineId"}), 400
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    update_amplifiers_status(user_id, conn, cur)
-
-    cur.execute("""
-        SELECT machine_type, level, last_activated, is_offline
-        FROM user_machines
-        WHERE user_id=? AND id=?
-    """, (user_id, machine_id))
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Machine not found"}), 404
-
-    machine_type = row["machine_type"]
-    machine_level = row["level"]
-    last_activated = row["last_activated"] or 0
-    is_offline = row["is_offline"]
-
-    COOL_MS = 10*1000
     now_ms = int(time.time()*1000)
-    elapsed = now_ms - last_activated
-    if elapsed < COOL_MS:
-        remain = COOL_MS - elapsed
-        cur.close()
-        conn.close()
-        return jsonify({"error":"Cooldown not finished","remainingMs":remain}), 400
-
-    cur.execute("SELECT corvax_count FROM users WHERE user_id=?", (user_id,))
-    urow = cur.fetchone()
-    if not urow:
-        cur.close()
-        conn.close()
-        return jsonify({"error":"User not found"}), 404
-
-    tcorvax_val = float(urow["corvax_count"])
-    catNips_val = float(get_or_create_resource(cur, user_id, 'catNips'))
-    energy_val  = float(get_or_create_resource(cur, user_id, 'energy'))
-
-    if machine_type == "amplifier":
-        status = "Online" if is_offline==0 else "Offline"
-        cur.close()
-        conn.close()
-        return jsonify({"status":"ok","message":status})
-
-    if machine_type == "incubator":
-        if last_activated == 0:
-            cur.execute("""
-                UPDATE user_machines
-                SET is_offline=0, last_activated=?
-                WHERE user_id=? AND id=?
-            """, (now_ms, user_id, machine_id))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return jsonify({
-                "status": "ok",
-                "message": "Incubator Online",
-                "newLastActivated": now_ms
-            })
-        else:
-            staked_cvx = float(data.get("stakedCvx", 0))
-            reward = min(10, int(staked_cvx // 100))
-            tcorvax_val += reward
-
-            cur.execute("""
-                UPDATE users
-                SET corvax_count=?
-                WHERE user_id=?
-            """, (tcorvax_val, user_id))
-
-            cur.execute("""
-                UPDATE user_machines
-                SET last_activated=?
-                WHERE user_id=? AND id=?
-            """, (now_ms, user_id, machine_id))
-
-            conn.commit()
-            cur.close()
-            conn.close()
-
-            return jsonify({
-                "status": "ok",
-                "machineId": machine_id,
-                "machineType": machine_type,
-                "newLastActivated": now_ms,
-                "stakedCVX": staked_cvx,
-                "reward": reward,
-                "updatedResources": {
-                    "tcorvax": tcorvax_val,
-                    "catNips": catNips_val,
-                    "energy": energy_val
-                }
-            })
 
-    if machine_type == "catLair":
-        gained = 5 + (machine_level - 1)
-        catNips_val += gained
-    elif machine_type == "reactor":
-        if catNips_val < 3:
-            cur.close()
-            conn.close()
-            return jsonify({"error":"Not enough Cat Nips to run the Reactor!"}), 400
-        catNips_val -= 3
-        if machine_level == 1:
-            base_t = 1.0
-        elif machine_level == 2:
-            base_t = 1.5
-        elif machine_level == 3:
-            base_t = 2.0
-        else:
-            base_t = 1.0
-
-        cur.execute("""
-            SELECT level, is_offline
-            FROM user_machines
-            WHERE user_id=? AND machine_type='amplifier'
-        """,(user_id,))
-        amp = cur.fetchone()
-        if amp and amp["is_offline"] == 0:
-            amp_level = amp["level"]
-            base_t += 0.5 * amp_level
-
-        base_e = 2
-        tcorvax_val += base_t
-        energy_val  += base_e
-
-    cur.execute("""
-        UPDATE user_machines
-        SET last_activated=?
-        WHERE user_id=? AND id=?
-    """,(now_ms,user_id,machine_id))
-
-    cur.execute("""
-        UPDATE users
-        SET corvax_count=?
-        WHERE user_id=?
-    """,(tcorvax_val,user_id))
-    set_resource_amount(cur, user_id,'catNips',catNips_val)
-    set_resource_amount(cur, user_id,'energy', energy_val)
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    # A paid incubator activation needs the staked balance of the player's
+    # bound wallet. Look it up before the write transaction below, so a
+    # slow gateway call never holds the database lock.
+    staked_cvx = None
+    with open_storage() as store:
+        machine = store.get_machine(user_id, machine_id)
+        account = store.get_account(user_id)
+    if (machine and machine["machine_type"] == "incubator" and machine["last_activated"]
+            and now_ms - machine["last_activated"] >= ACTIVATION_COOLDOWN_MS):
+        if not account:
+            return jsonify({"error": "Connect Radix wallet first!"}), 400
+        try:
+            staked_cvx = get_staking_service().get(account)
+        except Exception:
+            return jsonify({"error": "Staked CVX balance unavailable, try again"}), 503
+
+    with open_storage() as store:
+        update_amplifiers_status(user_id, store)
+
+        machine = store.get_machine(user_id, machine_id)
+        if not machine:
+            return jsonify({"error": "Machine not found"}), 404
+
+        machine_type = machine["machine_type"]
+        machine_level = machine["level"]
+        last_activated = machine["last_activated"] or 0
+        is_offline = machine["is_offline"]
+
+        COOL_MS = ACTIVATION_COOLDOWN_MS
+        elapsed = now_ms - last_activated
+        if elapsed < COOL_MS:
+            remain = COOL_MS - elapsed
+            return jsonify({"error":"Cooldown not finished","remainingMs":remain}), 400
+
+        user = store.get_user(user_id)
+        if not user:
+            return jsonify({"error":"User not found"}), 404
+
+        tcorvax_val = float(user["corvax_count"])
+        catNips_val = float(store.get_resource(user_id, 'catNips'))
+        energy_val  = float(store.get_resource(user_id, 'energy'))
+
+        if machine_type == "amplifier":
+            status = "Online" if is_offline==0 else "Offline"
+            return jsonify({"status":"ok","message":status})
+
+        if machine_type == "incubator":
+            if last_activated == 0:
+                store.update_machine(user_id, machine_id, is_offline=0, last_activated=now_ms)
+                store.commit()
+                return jsonify({
+                    "status": "ok",
+                    "message": "Incubator Online",
+                    "newLastActivated": now_ms
+                })
+            else:
+                if staked_cvx is None:
+                    # Activated by a concurrent request since the lookup.
+                    return jsonify({"error": "Cooldown not finished", "remainingMs": COOL_MS}), 400
+                reward = incubator_reward(staked_cvx)
+                tcorvax_val += reward
+
+                store.set_corvax(user_id, tcorvax_val)
+                store.update_machine(user_id, machine_id, last_activated=now_ms)
+                store.commit()
+
+                return jsonify({
+                    "status": "ok",
+                    "machineId": machine_id,
+                    "machineType": machine_type,
+                    "newLastActivated": now_ms,
+                    "stakedCVX": staked_cvx,
+                    "reward": reward,
+                    "updatedResources": {
+                        "tcorvax": tcorvax_val,
+                        "catNips": catNips_val,
+                        "energy": energy_val
+                    }
+                })
+
+        if machine_type == "catLair":
+            gained = cat_lair_yield(machine_level)
+            catNips_val += gained
+        elif machine_type == "reactor":
+            if catNips_val < REACTOR_CATNIP_COST:
+                return jsonify({"error":"Not enough Cat Nips to run the Reactor!"}), 400
+            catNips_val -= REACTOR_CATNIP_COST
+
+            amps = store.list_machines(user_id, 'amplifier')
+            amp = amps[0] if amps else None
+            online_amp_level = amp["level"] if amp and amp["is_offline"] == 0 else 0
+
+            gained_t, gained_e = reactor_yield(machine_level, online_amp_level)
+            tcorvax_val += gained_t
+            energy_val  += gained_e
+
+        store.update_machine(user_id, machine_id, last_activated=now_ms)
+        store.set_corvax(user_id, tcorvax_val)
+        store.set_resource(user_id,'catNips',catNips_val)
+        store.set_resource(user_id,'energy', energy_val)
+
+        store.commit()
 
     return jsonify({
         "status":"ok",
@@ -817,7 +514,74 @@ def activate_machine():
         }
     })
 
+@app.route("/api/stakedCvx", methods=["GET"])
+def get_staked_cvx():
+    if 'telegram_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    with open_storage() as store:
+        account = store.get_account(session['telegram_id'])
+    if not account:
+        return jsonify({"error": "Connect Radix wallet first!"}), 400
+
+    try:
+        staked_cvx = get_staking_service().get(account)
+    except Exception:
+        return jsonify({"error": "Staked CVX balance unavailable, try again"}), 503
+
+    return jsonify({"address": account, "stakedCvx": staked_cvx})
+
+@app.route("/api/rola/challenge", methods=["GET"])
+def rola_challenge():
+    if 'telegram_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    challenge = secrets.token_hex(32)
+    session['rola_challenge'] = challenge
+    session['rola_expires'] = int(time.time()) + ROLA_CHALLENGE_TTL
+    return jsonify({"challenge": challenge})
+
+@retry_on_lock
+def bind_account(user_id, address):
+    # Returns False if the account already belongs to another player.
+    with open_storage() as store:
+        owner = store.find_user_by_account(address)
+        if owner is not None and str(owner) != str(user_id):
+            return False
+        try:
+            store.set_account(user_id, address)
+            store.commit()
+        except sqlite3.IntegrityError:
+            return False
+    return True
+
+@app.route("/api/bindWallet", methods=["POST"])
+def bind_wallet():
+    if 'telegram_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    # Challenges are single use.
+    challenge = session.pop('rola_challenge', None)
+    if session.pop('rola_expires', 0) < time.time():
+        challenge = None
+
+    try:
+        address = verify_account_proof(request.json or {}, challenge,
+                                       RADIX_DAPP_DEFINITION, RADIX_EXPECTED_ORIGIN)
+    except RolaError as exc:
+        log.warning("wallet proof rejected", extra={"reason": str(exc)})
+        return jsonify({"error": f"Wallet proof rejected: {exc}"}), 400
+    except Exception:
+        return jsonify({"error": "Wallet check unavailable, try again"}), 503
+
+    if not bind_account(session['telegram_id'], address):
+        return jsonify({"error": "This wallet is linked to another player"}), 409
+
+    log.info("wallet bound", extra={"account": address})
+    return jsonify({"status": "ok", "account": address})
+
 @app.route("/api/syncLayout", methods=["POST"])
+@retry_on_lock
 def sync_layout():
     if 'telegram_id' not in session:
         return jsonify({"error":"Not logged in"}), 401
@@ -826,24 +590,19 @@ def sync_layout():
     machine_list = data.get("machines", [])
 
     user_id = session['telegram_id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    for m in machine_list:
-        mid = m.get("id")
-        mx = m.get("x",0)
-        my = m.get("y",0)
-        cur.execute("""
-            UPDATE user_machines
-            SET x=?, y=?
-            WHERE user_id=? AND id=?
-        """,(mx,my,user_id,mid))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with open_storage() as store:
+        for m in machine_list:
+            mid = m.get("id")
+            mx = m.get("x",0)
+            my = m.get("y",0)
+            store.update_machine(user_id, mid, x=mx, y=my)
+
+        store.commit()
 
     return jsonify({"status":"ok","message":"Layout updated"})
 
 if __name__ == "__main__":
+    # Requests are already logged by request_logging; keep werkzeug's
+    # per-request stdout lines out of nohup.out.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
     app.run(host="127.0.0.1", port=5000, debug=False)
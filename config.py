@@ -14,3 +14,75 @@ GROUP_ID    = os.getenv("GROUP_ID", "YOUR_OPTIONAL_GROUP_ID")
 FLASK_ENV   = os.getenv("FLASK_ENV", "development")
 
 DATABASE_PATH = "/root/telegram_bot/bot.db"
+
+# Comma-separated list of SQLite files player data is sharded across.
+# Changing it requires migrating existing data with shard_tool.py.
+DATABASE_SHARDS = [p.strip() for p in os.getenv("DATABASE_SHARDS", "").split(",") if p.strip()] \
+    or [DATABASE_PATH]
+
+# SQLite contention: how long a statement waits for a lock, and how often a
+# request that still hits "database is locked" is retried from the start
+DATABASE_BUSY_TIMEOUT_MS  = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", "2000"))
+DATABASE_LOCK_RETRIES     = int(os.getenv("DATABASE_LOCK_RETRIES", "3"))
+DATABASE_RETRY_BACKOFF_MS = float(os.getenv("DATABASE_RETRY_BACKOFF_MS", "50"))
+
+# "sqlite" (DATABASE_PATH) or "memory" (process-local, for tests/benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# Staked CVX lookups for the incubator: "gateway" (Radix Gateway API) or
+# "static" (balances from the JSON file in STAKED_CVX_STATIC_FILE).
+STAKED_CVX_FETCHER     = os.getenv("STAKED_CVX_FETCHER", "gateway")
+STAKED_CVX_TTL         = float(os.getenv("STAKED_CVX_TTL", "300"))
+STAKED_CVX_STATIC_FILE = os.getenv("STAKED_CVX_STATIC_FILE", "")
+RADIX_GATEWAY_URL      = os.getenv("RADIX_GATEWAY_URL", "https://mainnet.radixdlt.com")
+STAKED_CVX_RESOURCE    = os.getenv(
+    "STAKED_CVX_RESOURCE",
+    "resource_rdx1t5q4aa74uxcgzehk0u3hjy6kng9rqyr4uvktnud8ehdqaaez50n693"
+)
+STAKED_CVX_CACHE_MAX   = int(os.getenv("STAKED_CVX_CACHE_MAX", "10000"))
+
+# Wallet binding (rola.py): proofs must be signed for this dApp and origin
+RADIX_DAPP_DEFINITION = os.getenv(
+    "RADIX_DAPP_DEFINITION",
+    "account_rdx129994zq674n4mturvkqz7cz9t7gmtn5sjspxv7py2ahqnpdvxjsqum"
+)
+RADIX_EXPECTED_ORIGIN = os.getenv("RADIX_EXPECTED_ORIGIN", "https://test.cvxlab.net")
+ROLA_CHALLENGE_TTL    = int(os.getenv("ROLA_CHALLENGE_TTL", "300"))
+
+# Request profiling (see profiling.py); off unless one of the first two is set
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ADMIN_KEY   = os.getenv("PROFILE_ADMIN_KEY", "")
+PROFILE_ROUTES      = [r.strip() for r in os.getenv("PROFILE_ROUTES", "").split(",") if r.strip()]
+PROFILE_FORMAT      = os.getenv("PROFILE_FORMAT", "pstats")
+PROFILE_DIR         = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES   = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
+# Production serving (gunicorn.conf.py). MAX_CONCURRENT_REQUESTS is per
+# worker process; requests beyond it get 503 + Retry-After. 0 disables it.
+WEB_BIND                = os.getenv("WEB_BIND", "127.0.0.1:5000")
+WEB_WORKERS             = int(os.getenv("WEB_WORKERS", "4"))
+WEB_THREADS             = int(os.getenv("WEB_THREADS", "8"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "4"))
+SHED_RETRY_AFTER        = int(os.getenv("SHED_RETRY_AFTER", "1"))
+
+# Logging (see request_logging.py). Route overrides are comma-separated
+# endpoint=value pairs, e.g. LOG_ROUTE_LEVELS="get_game_state=WARNING"
+# and LOG_ROUTE_SAMPLING="get_game_state=20" (keep 1 in 20 access records).
+# "{worker}" in LOG_FILE is replaced by the gunicorn worker slot (0, 1, ...),
+# see gunicorn.conf.py.
+LOG_DIR            = os.getenv("LOG_DIR", "logs")
+LOG_FILE           = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL          = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES      = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS        = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_QUEUE_SIZE     = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE     = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1"))
+
+def _route_map(name):
+    pairs = (item.split("=", 1) for item in os.getenv(name, "").split(",") if "=" in item)
+    return {k.strip(): v.strip() for k, v in pairs}
+
+LOG_ROUTE_LEVELS   = {k: v.upper() for k, v in _route_map("LOG_ROUTE_LEVELS").items()}
+LOG_ROUTE_SAMPLING = {k: int(v) for k, v in _route_map("LOG_ROUTE_SAMPLING").items()}
@@ -0,0 +1,136 @@
+# game_rules.py
+#
+# Pure game rules shared by the Flask server (app.py) and the economy
+# simulator (simulator.py). Nothing in here touches the database, so any
+# balancing change made here applies to both.
+
+MACHINE_TYPES = ("catLair", "reactor", "amplifier", "incubator")
+
+MAX_LEVEL = {
+    "catLair": 3,
+    "reactor": 3,
+    "amplifier": 5,
+    "incubator": 1,
+}
+
+UPGRADE_BASE_COST = {
+    "catLair": {"tcorvax": 10},
+    "reactor": {"tcorvax": 10, "catNips": 10},
+    "amplifier": {"tcorvax": 10, "catNips": 10, "energy": 10},
+}
+
+ACTIVATION_COOLDOWN_MS = 10*1000
+AMPLIFIER_UPKEEP_INTERVAL_MS = 24*60*60*1000
+REACTOR_CATNIP_COST = 3
+REACTOR_ENERGY_YIELD = 2
+
+def build_cost(machine_type, how_many_already):
+    if machine_type == "catLair":
+        if how_many_already == 0:
+            return {"tcorvax": 10}
+        elif how_many_already == 1:
+            return {"tcorvax": 40}
+        else:
+            return None
+
+    elif machine_type == "reactor":
+        if how_many_already == 0:
+            return {"tcorvax": 10, "catNips": 10}
+        elif how_many_already == 1:
+            return {"tcorvax": 40, "catNips": 40}
+        else:
+            return None
+
+    elif machine_type == "amplifier":
+        if how_many_already == 0:
+            return {"tcorvax": 10, "catNips": 10, "energy": 10}
+        else:
+            return None
+
+    elif machine_type == "incubator":
+        if how_many_already == 0:
+            return {"tcorvax": 320, "catNips": 320, "energy": 320}
+        else:
+            return None
+
+    return None
+
+def upgrade_cost_for(machine_type, next_level, is_second):
+    # Cost of taking one machine to next_level, ignoring amplifier gating.
+    if machine_type not in UPGRADE_BASE_COST:
+        return None
+    if next_level > MAX_LEVEL[machine_type]:
+        return None
+
+    mult = 2 ** (next_level - 1)
+    cost_out = {}
+    for res, val in UPGRADE_BASE_COST[machine_type].items():
+        c = val * mult
+        if is_second and (machine_type in ["catLair","reactor"]):
+            c *= 4
+        cost_out[res] = c
+    return cost_out
+
+def amplifier_gate_met(next_level, cat_lair_levels, reactor_levels):
+    # Levels are ordered by machine id, i.e. build order.
+    if next_level == 4:
+        return (len(cat_lair_levels) >= 1 and cat_lair_levels[0] >= 3 and
+                len(reactor_levels) >= 1 and reactor_levels[0] >= 3)
+    elif next_level == 5:
+        return (len(cat_lair_levels) >= 2 and
+                cat_lair_levels[0] >= 3 and cat_lair_levels[1] >= 3 and
+                len(reactor_levels) >= 2 and
+                reactor_levels[0] >= 3 and reactor_levels[1] >= 3)
+    return True
+
+def incubator_unlocked(cat_lair_levels, reactor_levels, amplifier_levels):
+    if not cat_lair_levels or any(lvl != 3 for lvl in cat_lair_levels):
+        return False
+    if not reactor_levels or any(lvl != 3 for lvl in reactor_levels):
+        return False
+    return any(lvl == 5 for lvl in amplifier_levels)
+
+def amplifier_upkeep(level):
+    return 2 * level
+
+def settle_amplifier(level, is_offline, next_cost, energy, now_ms):
+    # Charges every upkeep period that fell due up to now_ms.
+    # Returns the new (is_offline, next_cost, energy).
+    if next_cost == 0:
+        next_cost = now_ms + AMPLIFIER_UPKEEP_INTERVAL_MS
+
+    cost = amplifier_upkeep(level)
+    if is_offline == 0:
+        while next_cost <= now_ms:
+            if energy >= cost:
+                energy -= cost
+                next_cost += AMPLIFIER_UPKEEP_INTERVAL_MS
+            else:
+                is_offline = 1
+                break
+    elif next_cost <= now_ms and energy >= cost:
+        energy -= cost
+        next_cost = now_ms + AMPLIFIER_UPKEEP_INTERVAL_MS
+        is_offline = 0
+
+    return is_offline, next_cost, energy
+
+def cat_lair_yield(level):
+    return 5 + (level - 1)
+
+def reactor_yield(level, online_amp_level=0):
+    # Returns (tcorvax, energy) for one reactor activation.
+    if level == 1:
+        base_t = 1.0
+    elif level == 2:
+        base_t = 1.5
+    elif level == 3:
+        base_t = 2.0
+    else:
+        base_t = 1.0
+    if online_amp_level:
+        base_t += 0.5 * online_amp_level
+    return base_t, REACTOR_ENERGY_YIELD
+
+def incubator_reward(staked_cvx):
+    return min(10, int(staked_cvx // 100))
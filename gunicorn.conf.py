@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+#
+# Production entry point, replacing `nohup python3 app.py`:
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Several worker processes with a few threads each share the SQLite shards
+# (WAL mode, see storage.py). Each worker admits MAX_CONCURRENT_REQUESTS at
+# a time; threads beyond that only exist to answer the overflow with a fast
+# 503 (serving.py), so keep WEB_THREADS above MAX_CONCURRENT_REQUESTS.
+#
+# The app is not preloaded: every worker imports it after the fork and so
+# gets its own database connections and staked-CVX refresh thread.
+
+import os
+
+# One log file per worker slot; RotatingFileHandler cannot share a file
+# between processes. Slots are reused when a worker is recycled, so the
+# number of files stays at about WEB_WORKERS however often max_requests
+# replaces a worker. Must be set before config is imported.
+os.environ.setdefault("LOG_FILE", "app-{worker}.log")
+
+from config import WEB_BIND, WEB_WORKERS, WEB_THREADS
+
+bind = WEB_BIND
+workers = WEB_WORKERS
+worker_class = "gthread"
+threads = WEB_THREADS
+preload_app = False
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up.
+max_requests = 10000
+max_requests_jitter = 1000
+
+# Access records are written by the app itself (request_logging.py).
+accesslog = None
+errorlog = "-"
+
+def pre_fork(server, worker):
+    # Runs in the master: give the new worker the lowest slot no live
+    # worker holds.
+    taken = {getattr(w, "log_slot", None) for w in server.WORKERS.values()}
+    worker.log_slot = next(i for i in range(len(taken) + 1) if i not in taken)
+
+def post_fork(server, worker):
+    os.environ["LOG_WORKER_SLOT"] = str(worker.log_slot)
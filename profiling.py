@@ -0,0 +1,177 @@
+# profiling.py
+#
+# Opt-in profiler for live requests. A request is profiled when either
+#
+#   - PROFILE_SAMPLE_RATE=N is set and it is the Nth request to its route
+#     (optionally only routes listed in PROFILE_ROUTES), or
+#   - it carries a valid X-Profile-Token header signed with PROFILE_ADMIN_KEY
+#     (generate one with `python profiling.py token /api/getGameState`).
+#
+# PROFILE_FORMAT picks the output: "pstats" (cProfile, shows sqlite3 calls
+# such as Cursor.execute as their own entries), "collapsed" (wall-clock
+# stack samples, one "a;b;c count" line per stack, for flamegraph tools) or
+# "both". Files go to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES.
+#
+# With neither setting present install_profiler() registers no hooks at all.
+
+import argparse
+import cProfile
+import collections
+import hashlib
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+
+from config import (
+    PROFILE_SAMPLE_RATE, PROFILE_ROUTES, PROFILE_ADMIN_KEY, PROFILE_FORMAT,
+    PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_INTERVAL_MS,
+)
+
+TOKEN_HEADER = "X-Profile-Token"
+
+# cProfile allows one active profiler per process on recent Pythons, and
+# profiling everything concurrently would skew the numbers anyway.
+_active = threading.Lock()
+_counters = collections.defaultdict(itertools.count)
+
+def make_token(path, ttl=300, key=PROFILE_ADMIN_KEY):
+    expires = int(time.time()) + ttl
+    sig = hmac.new(key.encode("utf-8"), f"{expires}:{path}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{expires}.{sig}"
+
+def verify_token(token, path, key=PROFILE_ADMIN_KEY):
+    if not key or not token:
+        return False
+    expires, _, sig = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(key.encode("utf-8"), f"{expires}:{path}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, sig)
+
+class StackSampler(threading.Thread):
+    # Samples one thread's Python stack every interval seconds.
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+class _Profile:
+    def __init__(self, fmt):
+        self.started = time.perf_counter()
+        self.cprofile = None
+        self.sampler = None
+        if fmt in ("pstats", "both"):
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if fmt in ("collapsed", "both"):
+            self.sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            self.sampler.start()
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        return time.perf_counter() - self.started
+
+    def write(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(os.path.join(directory, name + ".prof"))
+        if self.sampler is not None:
+            with open(os.path.join(directory, name + ".collapsed"), "w") as f:
+                for stack, count in self.sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        _rotate(directory, PROFILE_MAX_FILES)
+
+def _rotate(directory, keep):
+    files = [os.path.join(directory, f) for f in os.listdir(directory)
+             if f.endswith((".prof", ".collapsed"))]
+    if len(files) <= keep:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def install_profiler(app):
+    if not PROFILE_SAMPLE_RATE and not PROFILE_ADMIN_KEY:
+        return False
+
+    from flask import g, request, session
+
+    def should_profile():
+        if PROFILE_ADMIN_KEY and TOKEN_HEADER in request.headers:
+            if verify_token(request.headers[TOKEN_HEADER], request.path):
+                return True
+        if not PROFILE_SAMPLE_RATE:
+            return False
+        route = request.endpoint or "unknown"
+        if PROFILE_ROUTES and route not in PROFILE_ROUTES and request.path not in PROFILE_ROUTES:
+            return False
+        return next(_counters[route]) % PROFILE_SAMPLE_RATE == 0
+
+    @app.before_request
+    def _start_profile():
+        if should_profile() and _active.acquire(blocking=False):
+            try:
+                g._profile = _Profile(PROFILE_FORMAT)
+            except Exception:
+                _active.release()
+                raise
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+        try:
+            elapsed = profile.stop()
+        finally:
+            _active.release()
+        user = session.get("telegram_id", "anon")
+        name = f"{int(time.time() * 1000)}-{request.endpoint or 'unknown'}-{user}-{int(elapsed * 1000)}ms"
+        try:
+            profile.write(PROFILE_DIR, name)
+        except OSError:
+            pass
+
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Request profiler helpers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("token", help=f"print an {TOKEN_HEADER} value for a path")
+    p.add_argument("path")
+    p.add_argument("--ttl", type=int, default=300, help="seconds the token stays valid")
+    args = parser.parse_args()
+
+    if not PROFILE_ADMIN_KEY:
+        parser.error("PROFILE_ADMIN_KEY is not set")
+    print(make_token(args.path, args.ttl))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# request_logging.py
+#
+# Non-blocking structured logging. Request threads only put records on a
+# bounded in-memory queue; when the queue is full the record is dropped
+# (and counted) rather than waiting. One background thread drains the
+# queue in batches and writes JSON lines to a rotating file under LOG_DIR,
+# flushing once per batch.
+#
+# Every request produces an access record (route, user, status, latency,
+# outcome). LOG_ROUTE_LEVELS raises or lowers the threshold per endpoint,
+# and LOG_ROUTE_SAMPLING keeps only 1 in N successful access records of a
+# busy endpoint; warnings and errors are always kept.
+
+import atexit
+import collections
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from config import (
+    LOG_DIR, LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUPS, LOG_QUEUE_SIZE,
+    LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_ROUTE_LEVELS, LOG_ROUTE_SAMPLING,
+)
+
+LOGGER_NAME = "cvxlab"
+
+log = logging.getLogger(LOGGER_NAME)
+access_log = logging.getLogger(LOGGER_NAME + ".access")
+
+# Attributes every LogRecord has; anything else came in through extra=.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never waits: a full queue means the record is lost, not the request.
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render exceptions now, while the traceback is still alive, but
+        # leave the JSON formatting to the listener thread.
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # StreamHandler flushes after every record; the listener flushes once
+    # per batch instead.
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+class BatchingListener(threading.Thread):
+    def __init__(self, q, handler, source, batch_size=LOG_BATCH_SIZE, interval=LOG_FLUSH_INTERVAL):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = q
+        self.handler = handler
+        self.source = source
+        self.batch_size = batch_size
+        self.interval = interval
+        self.reported_drops = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not (self._done.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        dropped = self.source.dropped - self.reported_drops
+        if dropped:
+            self.reported_drops += dropped
+            batch.append(logging.makeLogRecord({
+                "name": LOGGER_NAME, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "log queue full, records dropped", "dropped": dropped,
+            }))
+        if not batch:
+            return
+        for record in batch:
+            try:
+                self.handler.handle(record)
+            except Exception:
+                pass
+        try:
+            self.handler.flush_batch()
+        except OSError:
+            pass
+
+    def stop(self):
+        self._done.set()
+        self.join(timeout=5)
+        self.handler.close()
+
+def _level(name):
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else None
+
+class RouteFilter(logging.Filter):
+    # Tags records logged inside a request with its route and user, then
+    # applies the per-endpoint level threshold and 1-in-N sampling.
+
+    def __init__(self, default_level=LOG_LEVEL, levels=LOG_ROUTE_LEVELS, sampling=LOG_ROUTE_SAMPLING):
+        super().__init__()
+        self.default_level = _level(default_level) or logging.INFO
+        self.levels = {k: _level(v) for k, v in levels.items() if _level(v)}
+        self.sampling = sampling
+        self.counters = collections.defaultdict(itertools.count)
+
+    def lowest_level(self):
+        return min([self.default_level, *self.levels.values()])
+
+    def filter(self, record):
+        from flask import has_request_context, request, session
+
+        if not hasattr(record, "route") and has_request_context():
+            record.route = request.endpoint or "unknown"
+            record.user = session.get("telegram_id")
+        route = getattr(record, "route", None)
+        if record.levelno < self.levels.get(route, self.default_level):
+            return False
+        rate = self.sampling.get(route)
+        if rate and rate > 1 and record.levelno <= logging.INFO:
+            return next(self.counters[route]) % rate == 0
+        return True
+
+_listener = None
+
+def configure_logging():
+    # Idempotent; returns the running listener.
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    path = os.path.join(LOG_DIR, LOG_FILE.replace("{worker}", os.getenv("LOG_WORKER_SLOT", "0")))
+    file_handler = BatchedRotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    file_handler.setFormatter(JsonFormatter())
+
+    route_filter = RouteFilter()
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(route_filter)
+
+    # The logger lets through the most detailed level any route asked for;
+    # RouteFilter holds every other route to LOG_LEVEL.
+    log.setLevel(route_filter.lowest_level())
+    log.addHandler(queue_handler)
+    log.propagate = False
+
+    _listener = BatchingListener(queue_handler.queue, file_handler, queue_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+def install_request_logging(app):
+    from flask import g, request, session
+
+    configure_logging()
+
+    @app.before_request
+    def _start_timer():
+        g._log_started = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        started = g.pop("_log_started", None)
+        status = response.status_code
+        if status >= 500:
+            level, outcome = logging.ERROR, "error"
+        elif status >= 400:
+            level, outcome = logging.WARNING, "rejected"
+        else:
+            level, outcome = logging.INFO, "ok"
+        if access_log.isEnabledFor(level):
+            access_log.log(level, "%s %s", request.method, request.path, extra={
+                "route": request.endpoint or "unknown",
+                "user": session.get("telegram_id"),
+                "status": status,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2) if started else None,
+                "outcome": outcome,
+            })
+        return response
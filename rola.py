@@ -0,0 +1,145 @@
+# rola.py
+#
+# Radix Off-Ledger Authentication: proves that the player controls the
+# wallet account they connect, before it is bound to their telegram id.
+#
+#   1. GET /api/rola/challenge hands out a random 32-byte challenge, kept in
+#      the (signed) session cookie for ROLA_CHALLENGE_TTL seconds.
+#   2. The wallet signs blake2b("R" || challenge || len(dApp) || dApp || origin)
+#      with the account's key and returns {challenge, address, proof}.
+#   3. verify_account_proof() checks the signature and that the key belongs
+#      to the account: it must be listed in the account's owner_keys
+#      metadata or, for accounts that never set owner_keys, the address must
+#      be the one derived from the key.
+#
+# Signature checks need the optional `cryptography` package.
+
+import hashlib
+import json
+import urllib.request
+
+from config import RADIX_GATEWAY_URL
+
+class RolaError(Exception):
+    pass
+
+# Entity type byte of accounts derived directly from a public key.
+VIRTUAL_ACCOUNT_BYTE = {"curve25519": 0x51, "secp256k1": 0xd1}
+KEY_HASH_TYPE = {"curve25519": "EddsaEd25519", "secp256k1": "EcdsaSecp256k1"}
+
+def _blake2b(data):
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+def signed_message_hash(challenge_hex, dapp_definition, origin):
+    dapp = dapp_definition.encode("ascii")
+    return _blake2b(b"R" + bytes.fromhex(challenge_hex) + bytes([len(dapp)]) + dapp
+                    + origin.encode("utf-8"))
+
+def public_key_hash(public_key):
+    return _blake2b(public_key)[-29:]
+
+_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_BECH32M_CONST = 0x2bc830a3
+
+def _polymod(values):
+    gen = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+    chk = 1
+    for v in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ v
+        for i in range(5):
+            chk ^= gen[i] if (top >> i) & 1 else 0
+    return chk
+
+def _bech32m_encode(hrp, data):
+    acc, bits, words = 0, 0, []
+    for byte in data:
+        acc = (acc << 8) | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            words.append((acc >> bits) & 31)
+    if bits:
+        words.append((acc << (5 - bits)) & 31)
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    mod = _polymod(expanded + words + [0] * 6) ^ _BECH32M_CONST
+    checksum = [(mod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(_CHARSET[w] for w in words + checksum)
+
+def virtual_account_address(curve, public_key, hrp="account_rdx"):
+    return _bech32m_encode(hrp, bytes([VIRTUAL_ACCOUNT_BYTE[curve]]) + public_key_hash(public_key))
+
+def verify_signature(curve, public_key, signature, message_hash):
+    try:
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519, utils
+    except ImportError:
+        raise RolaError("wallet proofs need the 'cryptography' package")
+
+    try:
+        if curve == "curve25519":
+            ed25519.Ed25519PublicKey.from_public_bytes(public_key).verify(signature, message_hash)
+        elif curve == "secp256k1":
+            # Radix encodes the signature as recovery id || r || s.
+            if len(signature) != 65:
+                return False
+            r = int.from_bytes(signature[1:33], "big")
+            s = int.from_bytes(signature[33:], "big")
+            key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), public_key)
+            key.verify(utils.encode_dss_signature(r, s), message_hash,
+                       ec.ECDSA(utils.Prehashed(hashes.SHA256())))
+        else:
+            return False
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+def fetch_owner_key_hashes(address, base_url=RADIX_GATEWAY_URL, timeout=5):
+    # Returns the owner_keys metadata as a set of (key_hash_type, hash_hex),
+    # or None when the account has never set it.
+    body = json.dumps({"addresses": [address], "opt_ins": {"explicit_metadata": ["owner_keys"]}}).encode("utf-8")
+    req = urllib.request.Request(base_url.rstrip("/") + "/state/entity/details", data=body,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        payload = json.load(resp)
+
+    for item in payload.get("items", []):
+        for section in ("explicit_metadata", "metadata"):
+            for entry in (item.get(section) or {}).get("items", []):
+                if entry.get("key") == "owner_keys":
+                    values = entry.get("value", {}).get("typed", {}).get("values", [])
+                    return {(v.get("key_hash_type"), v.get("hash_hex")) for v in values}
+    return None
+
+def verify_account_proof(signed, challenge, dapp_definition, origin, owner_keys=None):
+    # signed is the wallet's {challenge, address, proof: {publicKey, signature, curve}}.
+    # Returns the proven account address or raises RolaError.
+    try:
+        address = signed["address"]
+        proof = signed["proof"]
+        curve = proof["curve"]
+        public_key = bytes.fromhex(proof["publicKey"])
+        signature = bytes.fromhex(proof["signature"])
+    except (KeyError, TypeError, ValueError):
+        raise RolaError("malformed proof")
+
+    if not challenge or signed.get("challenge") != challenge:
+        raise RolaError("unknown or expired challenge")
+    if not isinstance(address, str) or not address.startswith("account_"):
+        raise RolaError("not an account proof")
+    if curve not in VIRTUAL_ACCOUNT_BYTE:
+        raise RolaError("unsupported curve")
+
+    if not verify_signature(curve, public_key, signature,
+                            signed_message_hash(challenge, dapp_definition, origin)):
+        raise RolaError("invalid signature")
+
+    keys = (owner_keys or fetch_owner_key_hashes)(address)
+    if keys is None:
+        hrp = address.rsplit("1", 1)[0]
+        if virtual_account_address(curve, public_key, hrp) != address:
+            raise RolaError("key does not control this account")
+    elif (KEY_HASH_TYPE[curve], public_key_hash(public_key).hex()) not in keys:
+        raise RolaError("key is not an owner key of this account")
+    return address
@@ -0,0 +1,51 @@
+# serving.py
+#
+# Request admission for multi-worker deployments (see gunicorn.conf.py).
+# Each worker process lets at most MAX_CONCURRENT_REQUESTS requests run at
+# once. Anything beyond that is turned away immediately with 503 and
+# Retry-After, instead of queueing behind SQLite's single write lock.
+# Requests that still find the database locked after storage.retry_on_lock
+# gave up get the same answer.
+
+import threading
+
+from config import MAX_CONCURRENT_REQUESTS, SHED_RETRY_AFTER
+from storage import DatabaseBusy
+
+def _busy_response(message):
+    from flask import jsonify
+    resp = jsonify({"error": message})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(SHED_RETRY_AFTER)
+    return resp
+
+# Static files never touch the database, and a page load fetches several
+# at once; counting them would shed the page's own JS and CSS.
+EXEMPT_ENDPOINTS = ("serve", "static")
+
+def install_load_shedding(app, limit=MAX_CONCURRENT_REQUESTS, exempt=EXEMPT_ENDPOINTS):
+    from flask import g, request
+
+    @app.errorhandler(DatabaseBusy)
+    def _database_busy(exc):
+        return _busy_response("Server busy, try again")
+
+    if limit <= 0:
+        return False
+
+    slots = threading.BoundedSemaphore(limit)
+
+    @app.before_request
+    def _admit():
+        if request.endpoint in exempt:
+            return
+        if not slots.acquire(blocking=False):
+            return _busy_response("Server busy, try again")
+        g._admitted = True
+
+    @app.teardown_request
+    def _release(exc):
+        if g.pop("_admitted", False):
+            slots.release()
+
+    return True
@@ -0,0 +1,216 @@
+# shard_tool.py
+#
+# Splits or rebalances player data across shard files.
+#
+#   python shard_tool.py migrate --source bot.db --dest shard0.db shard1.db shard2.db
+#   python shard_tool.py migrate --source shard0.db shard1.db --dest new0.db new1.db new2.db
+#   python shard_tool.py verify  --source bot.db --dest shard0.db shard1.db shard2.db
+#   python shard_tool.py which 123456789 --dest shard0.db shard1.db shard2.db
+#
+# Rows of the player tables are routed by sharding.shard_index(user_id), so
+# --dest must be listed in the same order as DATABASE_SHARDS will be. Any
+# other tables are copied unchanged into the first destination. Sources
+# made before the delta-sync columns existed are fine: destinations get the
+# current schema (storage.ensure_schema) and tables a source lacks are
+# treated as empty. Point DATABASE_SHARDS at the new files once migrate and
+# verify have succeeded.
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from sharding import PLAYER_TABLES, shard_index
+from storage import ensure_schema
+
+CHUNK_ROWS = 5000
+
+def _tables(conn):
+    rows = conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type='table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY name
+    """).fetchall()
+    return [(name, sql) for name, sql in rows]
+
+def _indexes(conn):
+    rows = conn.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE type='index' AND sql IS NOT NULL
+    """).fetchall()
+    return [r[0] for r in rows]
+
+def _copy_schema(src, dst):
+    for _, sql in _tables(src):
+        dst.execute(sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+    for sql in _indexes(src):
+        dst.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)
+                       .replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX IF NOT EXISTS", 1))
+    dst.commit()
+
+def _has_table(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (table,)).fetchone() is not None
+
+def _count(conn, table):
+    if not _has_table(conn, table):
+        return 0
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def _stream(conn, table):
+    cur = conn.execute(f"SELECT * FROM {table}")
+    columns = [d[0] for d in cur.description]
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        yield columns, rows
+
+def _insert_renumbering(dst, table, columns, rows):
+    # Machine ids are only unique within the shard that allocated them, so
+    # merging shards can collide. Colliding rows get a fresh id; returns
+    # (user_id, new_id) for each so _force_full_reload can tell the owners.
+    renumbered = []
+    placeholders = ", ".join("?" for _ in columns)
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    id_col = columns.index("id")
+    uid_col = columns.index("user_id")
+    with dst:
+        for row in rows:
+            try:
+                dst.execute(insert, row)
+            except sqlite3.IntegrityError:
+                row = list(row)
+                row[id_col] = None
+                new_id = dst.execute(insert, row).lastrowid
+                renumbered.append((row[uid_col], new_id))
+    return renumbered
+
+def _force_full_reload(dst, renumbered):
+    # A client's cached state still has the old machine id. Bumping
+    # state_version past it and raising delta_floor to it (as state_tool
+    # does on import) makes that cache too old for a delta.
+    users = sorted({uid for uid, _ in renumbered})
+    with dst:
+        dst.executemany("""
+            UPDATE users SET
+                state_version=state_version+1,
+                corvax_version=state_version+1,
+                delta_floor=state_version+1
+            WHERE user_id=?
+        """, [(uid,) for uid in users])
+        dst.executemany("""
+            UPDATE user_machines
+            SET version=(SELECT state_version FROM users WHERE users.user_id=user_machines.user_id)
+            WHERE id=?
+        """, [(mid,) for _, mid in renumbered])
+
+def migrate(sources, dests, chunk=CHUNK_ROWS):
+    overlap = {os.path.abspath(p) for p in sources} & {os.path.abspath(p) for p in dests}
+    if overlap:
+        raise SystemExit(f"Destination overlaps source: {sorted(overlap)}")
+
+    src_conns = [sqlite3.connect(p) for p in sources]
+    dst_conns = [sqlite3.connect(p) for p in dests]
+    try:
+        for dst in dst_conns:
+            # Source tables first, so extra columns of the bot's own schema
+            # survive; ensure_schema then only adds what is missing.
+            _copy_schema(src_conns[0], dst)
+            ensure_schema(dst)
+            for table in PLAYER_TABLES:
+                if dst.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    raise SystemExit(f"Destination already has rows in {table}; refusing to merge.")
+
+        renumbered = [[] for _ in dst_conns]
+        tables = sorted({name for src in src_conns for name, _ in _tables(src)})
+        for table in tables:
+            moved = 0
+            for src in src_conns:
+                if not _has_table(src, table):
+                    continue
+                for columns, rows in _stream(src, table):
+                    placeholders = ", ".join("?" for _ in columns)
+                    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                    if table in PLAYER_TABLES:
+                        uid = columns.index("user_id")
+                        buckets = [[] for _ in dst_conns]
+                        for row in rows:
+                            buckets[shard_index(row[uid], len(dst_conns))].append(row)
+                    else:
+                        insert = insert.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+                        buckets = [rows] + [[] for _ in dst_conns[1:]]
+                    for i, (dst, bucket) in enumerate(zip(dst_conns, buckets)):
+                        for start in range(0, len(bucket), chunk):
+                            rows_chunk = bucket[start:start + chunk]
+                            try:
+                                with dst:
+                                    dst.executemany(insert, rows_chunk)
+                            except sqlite3.IntegrityError:
+                                if table != "user_machines":
+                                    raise
+                                renumbered[i] += _insert_renumbering(dst, table, columns, rows_chunk)
+                    moved += len(rows)
+            print(f"{table}: {moved} rows")
+        # Users are copied after user_machines, so their versions are only
+        # bumped once every table is in place.
+        for dst, moved_ids in zip(dst_conns, renumbered):
+            if moved_ids:
+                _force_full_reload(dst, moved_ids)
+        total = sum(len(r) for r in renumbered)
+        if total:
+            print(f"user_machines: {total} machine ids reassigned to avoid collisions")
+    finally:
+        for conn in src_conns + dst_conns:
+            conn.close()
+
+def verify(sources, dests):
+    ok = True
+    src_conns = [sqlite3.connect(p) for p in sources]
+    dst_conns = [sqlite3.connect(p) for p in dests]
+    try:
+        for table in PLAYER_TABLES:
+            before = sum(_count(c, table) for c in src_conns)
+            after = sum(_count(c, table) for c in dst_conns)
+            misplaced = 0
+            for i, dst in enumerate(dst_conns):
+                if not _has_table(dst, table):
+                    continue
+                for (uid,) in dst.execute(f"SELECT DISTINCT user_id FROM {table}"):
+                    if shard_index(uid, len(dst_conns)) != i:
+                        misplaced += 1
+            status = "ok" if before == after and not misplaced else "MISMATCH"
+            ok = ok and status == "ok"
+            print(f"{table}: source={before} dest={after} misplaced_users={misplaced} {status}")
+    finally:
+        for conn in src_conns + dst_conns:
+            conn.close()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Split or rebalance player data across SQLite shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="copy data from source file(s) into a new shard set")
+    p.add_argument("--source", nargs="+", required=True)
+    p.add_argument("--dest", nargs="+", required=True)
+    p.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per transaction")
+
+    p = sub.add_parser("verify", help="compare row counts and shard placement")
+    p.add_argument("--source", nargs="+", required=True)
+    p.add_argument("--dest", nargs="+", required=True)
+
+    p = sub.add_parser("which", help="print the shard file for a telegram id")
+    p.add_argument("user_id")
+    p.add_argument("--dest", nargs="+", required=True)
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate(args.source, args.dest, args.chunk)
+    elif args.command == "verify":
+        sys.exit(0 if verify(args.source, args.dest) else 1)
+    elif args.command == "which":
+        print(args.dest[shard_index(args.user_id, len(args.dest))])
+
+if __name__ == "__main__":
+    main()
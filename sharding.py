@@ -0,0 +1,75 @@
+# sharding.py
+#
+# Player data (users, resources, user_machines and their delta-sync
+# tombstones) is partitioned across the
+# database files in DATABASE_SHARDS by a stable hash of the telegram id.
+# With a single shard this is just DATABASE_PATH, as before. The
+# wallet_accounts registry is not a player table: it lives on the first
+# shard, and shard_tool.py copies it there like any other table.
+#
+# user_machines ids come from each shard's own AUTOINCREMENT, so they are
+# unique per (user_id, id) rather than globally; shard_tool.py renumbers
+# the rare collision when shards are merged.
+
+import heapq
+import sqlite3
+import zlib
+
+from config import DATABASE_SHARDS
+
+PLAYER_TABLES = ("users", "resources", "user_machines", "machine_tombstones")
+
+def shard_index(user_id, n_shards):
+    # crc32 of the canonical decimal id: stable across processes and hosts,
+    # unlike hash(), and the same for "42" and 42.
+    try:
+        key = str(int(user_id))
+    except (TypeError, ValueError):
+        key = str(user_id)
+    return zlib.crc32(key.encode("utf-8")) % n_shards
+
+def shard_path(user_id, shards=None):
+    shards = shards or DATABASE_SHARDS
+    return shards[shard_index(user_id, len(shards))]
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def query_all_shards(sql, params=(), shards=None):
+    # Runs the same read on every shard and yields rows shard by shard.
+    for path in shards or DATABASE_SHARDS:
+        conn = _connect(path)
+        try:
+            yield from conn.execute(sql, params)
+        finally:
+            conn.close()
+
+def count_users(shards=None):
+    return sum(row[0] for row in query_all_shards("SELECT COUNT(*) FROM users", shards=shards))
+
+def find_user(user_id, shards=None):
+    conn = _connect(shard_path(user_id, shards))
+    try:
+        row = conn.execute("SELECT user_id, first_name, corvax_count FROM users WHERE user_id=?",
+                           (user_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def top_users_by_corvax(limit=10, shards=None):
+    # Each shard returns its own top N; merging those gives the global top N.
+    per_shard = []
+    for path in shards or DATABASE_SHARDS:
+        conn = _connect(path)
+        try:
+            per_shard.append([dict(r) for r in conn.execute("""
+                SELECT user_id, first_name, corvax_count FROM users
+                ORDER BY corvax_count DESC
+                LIMIT ?
+            """, (limit,))])
+        finally:
+            conn.close()
+    merged = heapq.merge(*per_shard, key=lambda r: r["corvax_count"], reverse=True)
+    return list(merged)[:limit]
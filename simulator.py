@@ -0,0 +1,493 @@
+# simulator.py
+#
+# Vectorized economy simulator. Advances a large population of synthetic
+# players in parallel as NumPy arrays, using the rules in game_rules.py.
+#
+# Shared by table: build_rule_tables() evaluates build_cost,
+# upgrade_cost_for, amplifier_gate_met, incubator_unlocked,
+# amplifier_upkeep, cat_lair_yield, reactor_yield and incubator_reward over
+# every reachable input, so changes to those apply here automatically.
+#
+# Re-implemented: the upkeep catch-up of settle_amplifier
+# (_settle_amplifiers, effective_amp_offline) and the per-round reactor
+# Cat Nip gating of an activation (_activate) are written out again in
+# vectorized form. tests/test_simulator_parity.py checks both against the
+# scalar rules on random states; keep it passing when either side changes.
+#
+#   python simulator.py --players 100000 --days 30 --strategy grinder=0.2 --strategy casual=0.8
+
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+
+from game_rules import (
+    MAX_LEVEL, ACTIVATION_COOLDOWN_MS, AMPLIFIER_UPKEEP_INTERVAL_MS,
+    REACTOR_CATNIP_COST,
+    build_cost, upgrade_cost_for, amplifier_gate_met, incubator_unlocked,
+    amplifier_upkeep, cat_lair_yield, reactor_yield, incubator_reward,
+)
+
+RESOURCES = ("tcorvax", "catNips", "energy")
+
+# One column per machine a player can own, in build order.
+SLOTS = (
+    ("catLair", 0),
+    ("catLair", 1),
+    ("reactor", 0),
+    ("reactor", 1),
+    ("amplifier", 0),
+    ("incubator", 0),
+)
+SLOT_INDEX = {f"{t}#{i}": n for n, (t, i) in enumerate(SLOTS)}
+CAT0, CAT1, REA0, REA1, AMP, INC = range(len(SLOTS))
+
+END, BUILD, UPGRADE = 0, 1, 2
+MAX_PURCHASES_PER_SESSION = 8
+
+RUSH_PLAN = (
+    "build:catLair#0", "build:reactor#0",
+    "upgrade:catLair#0", "upgrade:reactor#0",
+    "upgrade:catLair#0", "upgrade:reactor#0",
+    "build:amplifier#0", "upgrade:amplifier#0", "upgrade:amplifier#0",
+    "upgrade:amplifier#0",
+    "build:catLair#1", "build:reactor#1",
+    "upgrade:catLair#1", "upgrade:reactor#1",
+    "upgrade:catLair#1", "upgrade:reactor#1",
+    "upgrade:amplifier#0",
+    "build:incubator#0",
+)
+
+GREEDY_PLAN = (
+    "build:catLair#0", "build:reactor#0", "build:amplifier#0",
+    "build:catLair#1", "build:reactor#1",
+    "upgrade:catLair#0", "upgrade:catLair#1",
+    "upgrade:reactor#0", "upgrade:reactor#1",
+    "upgrade:amplifier#0",
+    "build:incubator#0",
+)
+
+# plan: steps as "<build|upgrade>:<machineType>#<n>".
+# ordered=True saves up for the next step in the plan; ordered=False buys
+# anything in the plan that is currently affordable, in plan order.
+STRATEGIES = {
+    "grinder": {"plan": RUSH_PLAN, "ordered": True,
+                "sessions_per_day": 12, "rounds_per_session": 10},
+    "regular": {"plan": RUSH_PLAN, "ordered": True,
+                "sessions_per_day": 4, "rounds_per_session": 6},
+    "casual": {"plan": RUSH_PLAN, "ordered": True,
+               "sessions_per_day": 2, "rounds_per_session": 3},
+    "impulsive": {"plan": GREEDY_PLAN, "ordered": False,
+                  "sessions_per_day": 4, "rounds_per_session": 5},
+}
+
+def _cost_vector(cost):
+    if cost is None:
+        return [np.inf] * len(RESOURCES)
+    return [float(cost.get(r, 0)) for r in RESOURCES]
+
+def _built(*levels):
+    return [lvl for lvl in levels if lvl > 0]
+
+def build_rule_tables():
+    # Evaluate every rule in game_rules over the full (small) state space once.
+    n = len(SLOTS)
+    max_lvl = max(MAX_LEVEL.values())
+
+    build = np.array([_cost_vector(build_cost(t, i)) for t, i in SLOTS])
+
+    upgrade = np.full((n, max_lvl + 1, len(RESOURCES)), np.inf)
+    for s, (t, i) in enumerate(SLOTS):
+        for lvl in range(1, MAX_LEVEL[t]):
+            upgrade[s, lvl] = _cost_vector(upgrade_cost_for(t, lvl + 1, i == 1))
+
+    max_level = np.array([MAX_LEVEL[t] for t, _ in SLOTS], dtype=np.int8)
+    prev_slot = np.array([s - 1 if i > 0 else -1 for s, (_, i) in enumerate(SLOTS)])
+
+    cl = MAX_LEVEL["catLair"] + 1
+    rl = MAX_LEVEL["reactor"] + 1
+    al = MAX_LEVEL["amplifier"] + 1
+
+    amp_gate = np.zeros((al + 1, cl, cl, rl, rl), dtype=bool)
+    for nl, c0, c1, r0, r1 in itertools.product(range(al + 1), range(cl), range(cl),
+                                                range(rl), range(rl)):
+        amp_gate[nl, c0, c1, r0, r1] = amplifier_gate_met(nl, _built(c0, c1), _built(r0, r1))
+
+    inc_unlock = np.zeros((cl, cl, rl, rl, al), dtype=bool)
+    for c0, c1, r0, r1, a in itertools.product(range(cl), range(cl), range(rl),
+                                               range(rl), range(al)):
+        inc_unlock[c0, c1, r0, r1, a] = incubator_unlocked(
+            _built(c0, c1), _built(r0, r1), _built(a))
+
+    cat_yield = np.zeros(cl)
+    for lvl in range(1, cl):
+        cat_yield[lvl] = cat_lair_yield(lvl)
+
+    reactor_t = np.zeros((rl, al))
+    reactor_e = np.zeros((rl, al))
+    for lvl, a in itertools.product(range(1, rl), range(al)):
+        reactor_t[lvl, a], reactor_e[lvl, a] = reactor_yield(lvl, a)
+
+    upkeep = np.array([amplifier_upkeep(lvl) for lvl in range(al)], dtype=float)
+
+    # Cheapest price of anything, per resource: players below it cannot buy.
+    every_cost = np.concatenate([build, upgrade.reshape(-1, len(RESOURCES))])
+    every_cost = every_cost[np.isfinite(every_cost).all(axis=1)]
+    min_cost = every_cost.min(axis=0)
+
+    return {
+        "build": build,
+        "upgrade": upgrade,
+        "max_level": max_level,
+        "prev_slot": prev_slot,
+        "amp_gate": amp_gate,
+        "inc_unlock": inc_unlock,
+        "cat_yield": cat_yield,
+        "reactor_t": reactor_t,
+        "reactor_e": reactor_e,
+        "upkeep": upkeep,
+        "min_cost": min_cost,
+    }
+
+def _compile_plan(plan):
+    kinds, slots = [], []
+    for step in plan:
+        action, _, slot = step.partition(":")
+        if action not in ("build", "upgrade") or slot not in SLOT_INDEX:
+            raise ValueError(f"Bad plan step: {step!r}")
+        kinds.append(BUILD if action == "build" else UPGRADE)
+        slots.append(SLOT_INDEX[slot])
+    return kinds, slots
+
+class Economy:
+    def __init__(self, n_players, strategy_weights, strategies=STRATEGIES,
+                 start_tcorvax=50.0, daily_tcorvax_grant=0.0,
+                 mean_staked_cvx=500.0, tick_minutes=60, round_interval_s=60,
+                 seed=None):
+        if round_interval_s * 1000 < ACTIVATION_COOLDOWN_MS:
+            raise ValueError("round_interval_s is shorter than the activation cooldown")
+
+        self.rng = np.random.default_rng(seed)
+        self.t = build_rule_tables()
+        self.n = n_players
+        self.tick_ms = int(tick_minutes * 60 * 1000)
+        self.daily_grant = daily_tcorvax_grant
+        self.start_ms = 1_700_000_000_000
+        self.now_ms = self.start_ms
+
+        names = list(strategy_weights)
+        weights = np.array([strategy_weights[k] for k in names], dtype=float)
+        self.strategy_names = names
+        self.strategy = self.rng.choice(len(names), size=n_players, p=weights / weights.sum())
+
+        compiled = [_compile_plan(strategies[k]["plan"]) for k in names]
+        width = max(len(k) for k, _ in compiled) + 1
+        self.plan_kind = np.full((len(names), width), END, dtype=np.int8)
+        self.plan_slot = np.zeros((len(names), width), dtype=np.int8)
+        for s, (kinds, slots) in enumerate(compiled):
+            self.plan_kind[s, :len(kinds)] = kinds
+            self.plan_slot[s, :len(slots)] = slots
+        self.ordered = np.array([strategies[k]["ordered"] for k in names])
+        day_fraction = self.tick_ms / AMPLIFIER_UPKEEP_INTERVAL_MS
+        self.session_prob = np.array([
+            min(1.0, strategies[k]["sessions_per_day"] * day_fraction) for k in names])
+        self.rounds = np.array([strategies[k]["rounds_per_session"] for k in names])
+
+        self.balance = np.zeros((n_players, len(RESOURCES)))
+        self.balance[:, 0] = start_tcorvax
+        self.levels = np.zeros((n_players, len(SLOTS)), dtype=np.int8)
+        self.amp_offline = np.zeros(n_players, dtype=bool)
+        self.amp_next_cost = np.zeros(n_players, dtype=np.int64)
+        self.inc_last = np.zeros(n_players, dtype=np.int64)
+        self.ptr = np.zeros(n_players, dtype=np.int16)
+        self.incubator_at_ms = np.full(n_players, -1, dtype=np.int64)
+
+        staked = self.rng.exponential(mean_staked_cvx, size=n_players)
+        self.inc_reward = np.frompyfunc(incubator_reward, 1, 1)(staked).astype(float)
+
+        self.minted = np.zeros(len(RESOURCES))
+        self.burned = np.zeros(len(RESOURCES))
+
+    # -- rules applied to a subset of players (global indices p) ---------
+
+    def _settle_amplifiers(self, p):
+        p = p[self.levels[p, AMP] > 0]
+        if not len(p):
+            return
+        now = self.now_ms
+        day = AMPLIFIER_UPKEEP_INTERVAL_MS
+        next_cost = self.amp_next_cost[p]
+        next_cost[next_cost == 0] = now + day
+        cost = self.t["upkeep"][self.levels[p, AMP]]
+        energy = self.balance[p, 2]
+        offline = self.amp_offline[p]
+        due = next_cost <= now
+
+        on = ~offline & due
+        periods = (now - next_cost[on]) // day + 1
+        paid = np.minimum(periods, np.floor(energy[on] / cost[on]).astype(np.int64))
+        energy[on] -= paid * cost[on]
+        next_cost[on] += paid * day
+        offline[on] = paid < periods
+
+        back = self.amp_offline[p] & due & (energy >= cost)
+        energy[back] -= cost[back]
+        next_cost[back] = now + day
+        offline[back] = False
+
+        self.burned[2] += self.balance[p, 2].sum() - energy.sum()
+        self.balance[p, 2] = energy
+        self.amp_next_cost[p] = next_cost
+        self.amp_offline[p] = offline
+
+    def _activate(self, p, rounds):
+        # Each round clicks every machine once; levels are fixed within a
+        # session, so per-round yields are looked up once.
+        t = self.t
+        lv = self.levels[p]
+        bal = self.balance[p]
+        tcorvax, catnips, energy = bal[:, 0], bal[:, 1], bal[:, 2]
+
+        cat_gain = t["cat_yield"][lv[:, CAT0]] + t["cat_yield"][lv[:, CAT1]]
+        amp_level = np.where(self.amp_offline[p], 0, lv[:, AMP])
+        reactors = [(lv[:, s] > 0, t["reactor_t"][lv[:, s], amp_level],
+                     t["reactor_e"][lv[:, s], amp_level]) for s in (REA0, REA1)]
+
+        # When the lairs out-produce what the reactors burn, every reactor runs
+        # every round and the session has a closed form; only the rest loop.
+        n_reactors = reactors[0][0].astype(int) + reactors[1][0]
+        need = REACTOR_CATNIP_COST * n_reactors
+        saturated = (cat_gain >= need) & (catnips + cat_gain >= need)
+        runs = np.where(saturated, rounds * n_reactors, 0).astype(float)
+        catnips += np.where(saturated, (cat_gain - need) * rounds, 0)
+        for has, gain_t, gain_e in reactors:
+            full = np.where(saturated & has, rounds, 0)
+            tcorvax += gain_t * full
+            energy += gain_e * full
+
+        rest = np.flatnonzero(~saturated)
+        rest_rounds = rounds[rest]
+        for r in range(int(rest_rounds.max(initial=0))):
+            rest = rest[rest_rounds > r]
+            rest_rounds = rest_rounds[rest_rounds > r]
+            catnips[rest] += cat_gain[rest]
+            for has, gain_t, gain_e in reactors:
+                run = rest[has[rest] & (catnips[rest] >= REACTOR_CATNIP_COST)]
+                catnips[run] -= REACTOR_CATNIP_COST
+                tcorvax[run] += gain_t[run]
+                energy[run] += gain_e[run]
+                runs[run] += 1
+
+        has_inc = lv[:, INC] > 0
+        paid_rounds = np.where(self.inc_last[p] == 0, rounds - 1, rounds) * has_inc
+        tcorvax += self.inc_reward[p] * paid_rounds
+        self.inc_last[p[has_inc]] = self.now_ms
+
+        start = self.balance[p]
+        self.minted[1] += (cat_gain * rounds).sum()
+        self.burned[1] += REACTOR_CATNIP_COST * runs.sum()
+        self.minted[0] += (tcorvax - start[:, 0]).sum()
+        self.minted[2] += (energy - start[:, 2]).sum()
+        self.balance[p] = bal
+
+    def _attempt(self, rows, kind, slot, lv, bal):
+        # Tries one build/upgrade for the given rows of the session-local
+        # lv/bal arrays, applying it in place where valid and affordable.
+        t = self.t
+        lv_all = lv[rows]
+        cur = lv_all[np.arange(len(rows)), slot]
+        c0, c1, r0, r1, a = (lv_all[:, s] for s in (CAT0, CAT1, REA0, REA1, AMP))
+
+        prev = t["prev_slot"][slot]
+        prev_built = (prev < 0) | (lv_all[np.arange(len(rows)), np.maximum(prev, 0)] > 0)
+        can_build = (kind == BUILD) & (cur == 0) & prev_built
+        can_build &= (slot != INC) | t["inc_unlock"][c0, c1, r0, r1, a]
+
+        next_lvl = np.minimum(cur + 1, t["amp_gate"].shape[0] - 1)
+        can_upgrade = (kind == UPGRADE) & (cur > 0) & (cur < t["max_level"][slot])
+        can_upgrade &= (slot != AMP) | t["amp_gate"][next_lvl, c0, c1, r0, r1]
+
+        cost = np.where((kind == BUILD)[:, None], t["build"][slot], t["upgrade"][slot, cur])
+        ok = (can_build | can_upgrade) & np.all(bal[rows] >= cost, axis=1)
+        if ok.any():
+            q = rows[ok]
+            bal[q] -= cost[ok]
+            self.burned += cost[ok].sum(axis=0)
+            lv[q, slot[ok]] = cur[ok] + 1
+        return ok
+
+    def _purchase(self, p):
+        p = p[np.all(self.balance[p] >= self.t["min_cost"], axis=1)]
+        if not len(p):
+            return
+        lv = self.levels[p]
+        bal = self.balance[p]
+        strat = self.strategy[p]
+
+        q = np.flatnonzero(self.ordered[strat])
+        for _ in range(MAX_PURCHASES_PER_SESSION):
+            s, ptr = strat[q], self.ptr[p[q]]
+            q = q[self.plan_kind[s, ptr] != END]
+            if not len(q):
+                break
+            s, ptr = strat[q], self.ptr[p[q]]
+            ok = self._attempt(q, self.plan_kind[s, ptr], self.plan_slot[s, ptr], lv, bal)
+            q = q[ok]
+            self.ptr[p[q]] += 1
+
+        q = np.flatnonzero(~self.ordered[strat])
+        for _ in range(MAX_PURCHASES_PER_SESSION):
+            bought = np.zeros(len(q), dtype=bool)
+            for j in range(self.plan_kind.shape[1]):
+                s = strat[q]
+                kind = self.plan_kind[s, j]
+                has = kind != END
+                if has.any():
+                    bought[has] |= self._attempt(q[has], kind[has], self.plan_slot[s[has], j], lv, bal)
+            q = q[bought]
+            if not len(q):
+                break
+
+        before = self.levels[p]
+        new_amp = p[(before[:, AMP] == 0) & (lv[:, AMP] > 0)]
+        self.amp_offline[new_amp] = False
+        self.amp_next_cost[new_amp] = 0
+        new_inc = p[(before[:, INC] == 0) & (lv[:, INC] > 0)]
+        self.inc_last[new_inc] = 0
+        self.incubator_at_ms[new_inc] = self.now_ms - self.start_ms
+
+        self.levels[p] = lv
+        self.balance[p] = bal
+
+    def effective_amp_offline(self):
+        # Offline status the server would report if every player polled now.
+        built = self.levels[:, AMP] > 0
+        cost = self.t["upkeep"][self.levels[:, AMP]]
+        energy = self.balance[:, 2]
+        next_cost = np.where(self.amp_next_cost == 0, self.now_ms + 1, self.amp_next_cost)
+        due = next_cost <= self.now_ms
+        periods = np.where(due, (self.now_ms - next_cost) // AMPLIFIER_UPKEEP_INTERVAL_MS + 1, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            affordable = np.floor(energy / np.where(cost > 0, cost, 1))
+        goes_off = ~self.amp_offline & due & (affordable < periods)
+        stays_off = self.amp_offline & ~(due & (energy >= cost))
+        return built, (goes_off | stays_off) & built
+
+    # -- driver -----------------------------------------------------------
+
+    def step(self):
+        self.now_ms += self.tick_ms
+        active = self.rng.random(self.n) < self.session_prob[self.strategy]
+        p = np.flatnonzero(active)
+        if not len(p):
+            return
+        self._settle_amplifiers(p)
+        self._activate(p, self.rounds[self.strategy[p]])
+        self._purchase(p)
+
+    def run(self, days):
+        ticks_per_day = max(1, AMPLIFIER_UPKEEP_INTERVAL_MS // self.tick_ms)
+        supply_start = self.balance.sum(axis=0)
+        daily = []
+        started = time.perf_counter()
+        for _ in range(days):
+            if self.daily_grant:
+                self.balance[:, 0] += self.daily_grant
+                self.minted[0] += self.daily_grant * self.n
+            for _ in range(ticks_per_day):
+                self.step()
+            built, offline = self.effective_amp_offline()
+            daily.append({
+                "supply": dict(zip(RESOURCES, self.balance.sum(axis=0).round(2).tolist())),
+                "ampOfflineRate": float(offline.sum() / built.sum()) if built.any() else 0.0,
+                "incubatorShare": float((self.levels[:, INC] > 0).mean()),
+            })
+        elapsed = time.perf_counter() - started
+        return self.report(days, supply_start, daily, elapsed)
+
+    def report(self, days, supply_start, daily, elapsed):
+        supply_end = self.balance.sum(axis=0)
+
+        def incubator_stats(mask):
+            at = self.incubator_at_ms[mask]
+            reached = at[at >= 0] / AMPLIFIER_UPKEEP_INTERVAL_MS
+            out = {"players": int(mask.sum()),
+                   "reachedShare": float(len(reached) / max(1, mask.sum()))}
+            if len(reached):
+                p10, p50, p90 = np.percentile(reached, [10, 50, 90])
+                out.update({"p10Days": round(float(p10), 2),
+                            "p50Days": round(float(p50), 2),
+                            "p90Days": round(float(p90), 2)})
+            return out
+
+        inflation = {}
+        for i, res in enumerate(RESOURCES):
+            inflation[res] = {
+                "minted": round(float(self.minted[i]), 2),
+                "burned": round(float(self.burned[i]), 2),
+                "supplyStart": round(float(supply_start[i]), 2),
+                "supplyEnd": round(float(supply_end[i]), 2),
+                "netPerPlayerPerDay": round(float((supply_end[i] - supply_start[i]) / self.n / days), 4),
+            }
+
+        offline_rates = [d["ampOfflineRate"] for d in daily]
+        return {
+            "players": self.n,
+            "days": days,
+            "elapsedSeconds": round(elapsed, 3),
+            "timeToIncubator": incubator_stats(np.ones(self.n, dtype=bool)),
+            "timeToIncubatorByStrategy": {
+                name: incubator_stats(self.strategy == s)
+                for s, name in enumerate(self.strategy_names)
+            },
+            "inflation": inflation,
+            "amplifierOffline": {
+                "meanRate": round(float(np.mean(offline_rates)), 4) if offline_rates else 0.0,
+                "finalRate": round(offline_rates[-1], 4) if offline_rates else 0.0,
+            },
+            "daily": daily,
+        }
+
+def simulate(n_players=100_000, days=30, strategy_weights=None, **kwargs):
+    if strategy_weights is None:
+        strategy_weights = {name: 1.0 for name in STRATEGIES}
+    return Economy(n_players, strategy_weights, **kwargs).run(days)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the CVX Lab economy.")
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--strategy", action="append", default=[],
+                        help="name=weight, repeatable (choices: %s)" % ", ".join(STRATEGIES))
+    parser.add_argument("--start-tcorvax", type=float, default=50.0)
+    parser.add_argument("--daily-grant", type=float, default=0.0,
+                        help="tCorvax granted to every player per day (bot rewards)")
+    parser.add_argument("--mean-staked-cvx", type=float, default=500.0)
+    parser.add_argument("--tick-minutes", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--daily", action="store_true", help="include the per-day series")
+    args = parser.parse_args()
+
+    weights = {}
+    for item in args.strategy:
+        name, _, w = item.partition("=")
+        if name not in STRATEGIES:
+            parser.error(f"unknown strategy {name!r}")
+        weights[name] = float(w or 1)
+
+    result = simulate(
+        args.players, args.days, weights or None,
+        start_tcorvax=args.start_tcorvax,
+        daily_tcorvax_grant=args.daily_grant,
+        mean_staked_cvx=args.mean_staked_cvx,
+        tick_minutes=args.tick_minutes,
+        seed=args.seed,
+    )
+    if not args.daily:
+        result.pop("daily")
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# staking.py
+#
+# Server-side staked-CVX balances for the incubator reward. Balances come
+# from a pluggable fetcher and are cached per wallet address:
+#
+#   - entries live for STAKED_CVX_TTL seconds, and at most
+#     STAKED_CVX_CACHE_MAX are kept (least recently used go first);
+#   - concurrent lookups of the same address share one fetch;
+#   - a background thread re-fetches, in batches, entries that are about to
+#     expire and were used recently, so an active player's activation is
+#     served from the cache without an external call.
+
+import collections
+import json
+import threading
+import time
+import urllib.request
+
+from config import (
+    STAKED_CVX_FETCHER, STAKED_CVX_TTL, STAKED_CVX_STATIC_FILE,
+    RADIX_GATEWAY_URL, STAKED_CVX_RESOURCE, STAKED_CVX_CACHE_MAX,
+)
+
+class StakedBalanceFetcher:
+    # Returns {address: balance} for the given addresses. Addresses missing
+    # from the result are treated as holding nothing.
+    max_batch = 20
+
+    def fetch_many(self, addresses):
+        raise NotImplementedError
+
+class StaticFetcher(StakedBalanceFetcher):
+    # Local stand-in for tests and development: balances from a dict.
+    max_batch = 1000
+
+    def __init__(self, balances=None):
+        self.balances = dict(balances or {})
+        self.calls = 0
+
+    def fetch_many(self, addresses):
+        self.calls += 1
+        return {a: float(self.balances.get(a, 0)) for a in addresses}
+
+class GatewayFetcher(StakedBalanceFetcher):
+    # Radix Gateway /state/entity/details, one request per batch of accounts.
+
+    def __init__(self, base_url=RADIX_GATEWAY_URL, resource_address=STAKED_CVX_RESOURCE, timeout=5):
+        self.url = base_url.rstrip("/") + "/state/entity/details"
+        self.resource_address = resource_address
+        self.timeout = timeout
+
+    def fetch_many(self, addresses):
+        body = json.dumps({"addresses": list(addresses), "aggregation_level": "Global"}).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            payload = json.load(resp)
+
+        out = {}
+        for item in payload.get("items", []):
+            balance = 0.0
+            for res in item.get("fungible_resources", {}).get("items", []):
+                if res.get("resource_address") == self.resource_address:
+                    balance = float(res.get("amount", 0))
+                    break
+            out[item.get("address")] = balance
+        return out
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "last_used")
+
+    def __init__(self, value, expires_at, last_used):
+        self.value = value
+        self.expires_at = expires_at
+        self.last_used = last_used
+
+class _Pending:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class StakedBalanceService:
+    def __init__(self, fetcher, ttl=STAKED_CVX_TTL, refresh_ahead=None, idle_after=None,
+                 refresh_interval=None, max_entries=STAKED_CVX_CACHE_MAX, clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else ttl / 4
+        self.idle_after = idle_after if idle_after is not None else ttl * 4
+        self.refresh_interval = refresh_interval if refresh_interval is not None else max(1.0, ttl / 10)
+        self.max_entries = max_entries
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.cache = collections.OrderedDict()
+        self.inflight = {}
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def get(self, address):
+        now = self.clock()
+        with self.lock:
+            entry = self.cache.get(address)
+            if entry is not None and entry.expires_at > now:
+                entry.last_used = now
+                self.cache.move_to_end(address)
+                return entry.value
+            pending = self.inflight.get(address)
+            owner = pending is None
+            if owner:
+                pending = self.inflight[address] = _Pending()
+
+        if owner:
+            self._fetch_into([address], {address: pending})
+        else:
+            pending.done.wait()
+
+        if pending.error is not None:
+            # Fall back to the expired value rather than failing the request.
+            with self.lock:
+                entry = self.cache.get(address)
+            if entry is not None:
+                return entry.value
+            raise pending.error
+        return pending.value
+
+    def _fetch_into(self, addresses, pendings):
+        try:
+            values = self.fetcher.fetch_many(addresses)
+            error = None
+        except Exception as exc:
+            values, error = {}, exc
+
+        now = self.clock()
+        with self.lock:
+            for address in addresses:
+                pending = pendings.get(address)
+                if error is None:
+                    value = float(values.get(address, 0))
+                    entry = self.cache.get(address)
+                    last_used = entry.last_used if entry and pending is None else now
+                    self.cache[address] = _Entry(value, now + self.ttl, last_used)
+                    if pending is not None:
+                        self.cache.move_to_end(address)
+                if pending is not None:
+                    pending.value = value if error is None else None
+                    pending.error = error
+                    self.inflight.pop(address, None)
+                    pending.done.set()
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def refresh_due(self):
+        # One refresh pass: batch-fetch recently used entries close to expiry
+        # and drop entries nobody asked for in a while.
+        now = self.clock()
+        with self.lock:
+            for address in [a for a, e in self.cache.items() if now - e.last_used > self.idle_after]:
+                del self.cache[address]
+            due = [a for a, e in self.cache.items()
+                   if e.expires_at - now <= self.refresh_ahead and a not in self.inflight]
+
+        batch = max(1, self.fetcher.max_batch)
+        for i in range(0, len(due), batch):
+            self._fetch_into(due[i:i + batch], {})
+        return len(due)
+
+    def start(self):
+        with self.lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._run, name="staked-cvx-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh_due()
+            except Exception:
+                pass
+
+def _load_static_balances():
+    if not STAKED_CVX_STATIC_FILE:
+        return {}
+    with open(STAKED_CVX_STATIC_FILE) as f:
+        return json.load(f)
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_staking_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            if STAKED_CVX_FETCHER == "static":
+                fetcher = StaticFetcher(_load_static_balances())
+            elif STAKED_CVX_FETCHER == "gateway":
+                fetcher = GatewayFetcher()
+            else:
+                raise ValueError(f"Unknown STAKED_CVX_FETCHER: {STAKED_CVX_FETCHER!r}")
+            _service = StakedBalanceService(fetcher)
+            _service.start()
+        return _service
@@ -0,0 +1,360 @@
+# state_tool.py
+#
+# Streams player state (users, resources, user_machines) in and out of the
+# shard files as JSONL, one player per line:
+#
+#   {"user_id": 42, "first_name": "Ann", "corvax_count": 120.0, "radix_account": null,
+#    "resources": {"catNips": 4.0, "energy": 2.0},
+#    "machines": [{"id": 7, "machine_type": "catLair", "x": 0, "y": 0, "level": 3,
+#                  "last_activated": 0, "is_offline": 0, "next_cost_time": 0}]}
+#
+#   python state_tool.py export -o players.jsonl [--source shard0.db shard1.db]
+#   python state_tool.py import players.jsonl [--dest shard0.db shard1.db] [--chunk 500]
+#
+# Export walks users, resources and machines in user_id order side by side,
+# so only one player is held in memory at a time. Each shard is read inside
+# a single read transaction and never takes a write lock.
+#
+# Import replaces each player's rows in chunks of --chunk players, one short
+# transaction per shard per chunk. Players that break the machine rules in
+# game_rules.py are skipped and written to --rejects. After every chunk the
+# input offset is saved to --checkpoint (default <input>.checkpoint), so an
+# interrupted import picks up where it stopped when run again; re-importing
+# a player is harmless. Imported players get a new state version above
+# their delta floor, so clients reload the full state instead of a delta.
+# Bound wallets are registered in the first destination's wallet_accounts
+# (see storage.SQLiteStorage.claim_account); a player whose account is
+# already bound to someone else is imported without it.
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from config import DATABASE_SHARDS
+from game_rules import MACHINE_TYPES, MAX_LEVEL, build_cost, amplifier_gate_met, incubator_unlocked
+from sharding import shard_index
+from storage import MACHINE_COLUMNS, ensure_schema
+
+CHUNK_PLAYERS = 500
+FETCH_ROWS = 5000
+
+MACHINE_KEYS = MACHINE_COLUMNS[:1] + MACHINE_COLUMNS[2:]
+
+def _rows(conn, sql):
+    cur = conn.execute(sql)
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        yield from rows
+
+def _take(rows, pending, user_id):
+    # Collects the rows of one user from a user_id-ordered stream. pending
+    # holds the first row already read past the previous user.
+    out = []
+    row = pending[0]
+    while row is not None and row[0] <= user_id:
+        if row[0] == user_id:
+            out.append(row)
+        row = next(rows, None)
+    pending[0] = row
+    return out
+
+def export_players(paths):
+    # Yields one player dict at a time.
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("BEGIN")
+            # Files the app never opened have no radix_account column yet.
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(users)")]
+            account = "radix_account" if "radix_account" in columns else "NULL"
+            users = _rows(conn, f"SELECT user_id, first_name, corvax_count, {account} FROM users ORDER BY user_id")
+            resources = _rows(conn, "SELECT user_id, resource_name, amount FROM resources ORDER BY user_id")
+            machines = _rows(conn, f"""
+                SELECT user_id, {', '.join(MACHINE_KEYS)} FROM user_machines
+                ORDER BY user_id, id
+            """)
+            res_pending = [next(resources, None)]
+            mach_pending = [next(machines, None)]
+            for user_id, first_name, corvax_count, radix_account in users:
+                yield {
+                    "user_id": user_id,
+                    "first_name": first_name,
+                    "corvax_count": corvax_count,
+                    "radix_account": radix_account,
+                    "resources": {name: amount for _, name, amount in _take(resources, res_pending, user_id)},
+                    "machines": [dict(zip(MACHINE_KEYS, row[1:]))
+                                 for row in _take(machines, mach_pending, user_id)],
+                }
+            conn.rollback()
+        finally:
+            conn.close()
+
+def _max_count(machine_type):
+    n = 0
+    while build_cost(machine_type, n) is not None:
+        n += 1
+    return n
+
+MAX_COUNT = {t: _max_count(t) for t in MACHINE_TYPES}
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_player(player):
+    # Returns a list of problems; empty means the player can be imported.
+    errors = []
+    if not _is_int(player.get("user_id")):
+        return ["user_id must be an integer"]
+    if not isinstance(player.get("corvax_count", 0), (int, float)) or player.get("corvax_count", 0) < 0:
+        errors.append("corvax_count must be a non-negative number")
+    if player.get("radix_account") is not None and not isinstance(player["radix_account"], str):
+        errors.append("radix_account must be a string or null")
+    resources = player.get("resources", {})
+    if not isinstance(resources, dict):
+        return errors + ["resources must be an object"]
+    for name, amount in resources.items():
+        if not isinstance(amount, (int, float)) or amount < 0:
+            errors.append(f"resource {name} must be a non-negative number")
+
+    machines = player.get("machines", [])
+    if not isinstance(machines, list):
+        return errors + ["machines must be a list"]
+    for m in machines:
+        if not isinstance(m, dict):
+            return errors + ["every machine must be an object"]
+        if m.get("id") is not None and not _is_int(m.get("id")):
+            return errors + [f"machine id {m.get('id')!r} must be an integer"]
+        for key in ("x", "y", "last_activated", "next_cost_time"):
+            if not _is_number(m.get(key, 0)):
+                errors.append(f"machine {m.get('id')}: {key} must be a number")
+    if errors:
+        return errors
+
+    levels = {t: [] for t in MACHINE_TYPES}
+    for m in sorted(machines, key=lambda m: m.get("id") or 0):
+        machine_type = m.get("machine_type")
+        if machine_type not in MAX_LEVEL:
+            errors.append(f"machine {m.get('id')}: unknown type {machine_type!r}")
+            continue
+        level = m.get("level")
+        if not isinstance(level, int) or not 1 <= level <= MAX_LEVEL[machine_type]:
+            errors.append(f"machine {m.get('id')}: level {level!r} out of range for {machine_type}")
+            continue
+        if m.get("is_offline") not in (0, 1):
+            errors.append(f"machine {m.get('id')}: is_offline must be 0 or 1")
+        levels[machine_type].append(level)
+
+    for machine_type, owned in levels.items():
+        if len(owned) > MAX_COUNT[machine_type]:
+            errors.append(f"{len(owned)} {machine_type} machines, at most {MAX_COUNT[machine_type]} allowed")
+    for level in levels["amplifier"]:
+        if not amplifier_gate_met(level, levels["catLair"], levels["reactor"]):
+            errors.append(f"amplifier level {level} without the required catLair/reactor levels")
+    if levels["incubator"] and not incubator_unlocked(levels["catLair"], levels["reactor"], levels["amplifier"]):
+        errors.append("incubator without all machines at max level")
+    return errors
+
+def _write_players(conn, players):
+    # Replaces the given players' rows in one transaction. Returns how many
+    # machines had to be given a new id.
+    players = list({p["user_id"]: p for p in players}.values())
+    ids = [(p["user_id"],) for p in players]
+    with conn:
+        # Bumping state_version past the old one and raising delta_floor to
+        # it makes every client's cached version too old for a delta.
+        conn.executemany("""
+            UPDATE users SET first_name=?, corvax_count=?, radix_account=?,
+                state_version=state_version+1,
+                corvax_version=state_version+1,
+                delta_floor=state_version+1
+            WHERE user_id=?
+        """, [(p.get("first_name"), p.get("corvax_count", 0), p.get("radix_account"), p["user_id"])
+              for p in players])
+        conn.executemany("""
+            INSERT INTO users (user_id, first_name, corvax_count, radix_account,
+                               state_version, corvax_version, delta_floor)
+            SELECT ?, ?, ?, ?, 1, 1, 1
+            WHERE NOT EXISTS (SELECT 1 FROM users WHERE user_id=?)
+        """, [(p["user_id"], p.get("first_name"), p.get("corvax_count", 0), p.get("radix_account"),
+               p["user_id"]) for p in players])
+        versions = {p["user_id"]: conn.execute("SELECT state_version FROM users WHERE user_id=?",
+                                               (p["user_id"],)).fetchone()[0]
+                    for p in players}
+
+        conn.executemany("DELETE FROM resources WHERE user_id=?", ids)
+        conn.executemany("DELETE FROM user_machines WHERE user_id=?", ids)
+        conn.executemany("DELETE FROM machine_tombstones WHERE user_id=?", ids)
+        conn.executemany("""
+            INSERT INTO resources (user_id, resource_name, amount, version)
+            VALUES (?, ?, ?, ?)
+        """, [(p["user_id"], name, amount, versions[p["user_id"]])
+              for p in players for name, amount in p.get("resources", {}).items()])
+
+        columns = list(MACHINE_COLUMNS) + ["version"]
+        machine_rows = [
+            [m.get("id"), p["user_id"]] + [m.get(k, 0) for k in MACHINE_KEYS[1:]] + [versions[p["user_id"]]]
+            for p in players for m in p.get("machines", [])
+        ]
+        insert = f"""
+            INSERT INTO user_machines ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+        """
+        conn.execute("SAVEPOINT machines")
+        try:
+            conn.executemany(insert, machine_rows)
+            conn.execute("RELEASE machines")
+            return 0
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO machines")
+            conn.execute("RELEASE machines")
+
+        # Some exported ids are taken by other players on this shard: keep
+        # the free ones and let AUTOINCREMENT number the rest.
+        keep, renumber, seen = [], [], set()
+        for row in machine_rows:
+            taken = row[0] is None or row[0] in seen or conn.execute(
+                "SELECT 1 FROM user_machines WHERE id=?", (row[0],)).fetchone()
+            seen.add(row[0])
+            (renumber if taken else keep).append(row)
+        conn.executemany(insert, keep)
+        conn.executemany(insert, [[None] + row[1:] for row in renumber])
+        return len(renumber)
+
+def _load_checkpoint(path, input_path):
+    if not path or not os.path.exists(path):
+        return {"input": os.path.abspath(input_path), "offset": 0, "imported": 0, "rejected": 0}
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {path} belongs to {state.get('input')}; remove it to start over.")
+    return state
+
+def _save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def _claim_accounts(conn, players):
+    # Registers the players' wallets on the registry shard. Clears (and
+    # returns the ids of) players whose account another player holds.
+    unbound = []
+    with conn:
+        for p in {p["user_id"]: p for p in players}.values():
+            address = p.get("radix_account")
+            conn.execute("DELETE FROM wallet_accounts WHERE user_id=? AND radix_account IS NOT ?",
+                         (p["user_id"], address))
+            if address is None:
+                continue
+            conn.execute("INSERT OR IGNORE INTO wallet_accounts (radix_account, user_id) VALUES (?, ?)",
+                         (address, p["user_id"]))
+            owner = conn.execute("SELECT user_id FROM wallet_accounts WHERE radix_account=?",
+                                 (address,)).fetchone()[0]
+            if owner != p["user_id"]:
+                p["radix_account"] = None
+                unbound.append(p["user_id"])
+    return unbound
+
+def import_players(input_path, dests, chunk=CHUNK_PLAYERS, checkpoint=None, rejects=None):
+    checkpoint = checkpoint or input_path + ".checkpoint"
+    state = _load_checkpoint(checkpoint, input_path)
+    conns = [sqlite3.connect(p) for p in dests]
+    rejects_file = open(rejects, "a") if rejects else None
+    renumbered = 0
+    try:
+        for conn in conns:
+            ensure_schema(conn)
+        with open(input_path, "rb") as f:
+            f.seek(state["offset"])
+            buckets = [[] for _ in conns]
+            buffered = 0
+            line_no = state["imported"] + state["rejected"]
+            while True:
+                line = f.readline()
+                if line.strip():
+                    line_no += 1
+                    try:
+                        player = json.loads(line)
+                    except ValueError as exc:
+                        player, errors = None, [f"invalid JSON: {exc}"]
+                    else:
+                        # A line validation cannot make sense of is rejected
+                        # like any other bad line, not allowed to stop the run.
+                        try:
+                            errors = validate_player(player) if isinstance(player, dict) else ["not an object"]
+                        except Exception as exc:
+                            errors = [f"invalid player: {exc!r}"]
+                    if errors:
+                        state["rejected"] += 1
+                        print(f"line {line_no}: rejected: {'; '.join(errors)}", file=sys.stderr)
+                        if rejects_file:
+                            rejects_file.write(line.decode("utf-8", "replace").rstrip("\n") + "\n")
+                    else:
+                        buckets[shard_index(player["user_id"], len(conns))].append(player)
+                        buffered += 1
+                if buffered >= chunk or not line:
+                    for user_id in _claim_accounts(conns[0], [p for bucket in buckets for p in bucket]):
+                        print(f"user {user_id}: wallet bound to another player, imported unbound",
+                              file=sys.stderr)
+                    for conn, bucket in zip(conns, buckets):
+                        if bucket:
+                            renumbered += _write_players(conn, bucket)
+                    state["imported"] += buffered
+                    buckets = [[] for _ in conns]
+                    buffered = 0
+                    state["offset"] = f.tell()
+                    if rejects_file:
+                        rejects_file.flush()
+                    _save_checkpoint(checkpoint, state)
+                if not line:
+                    break
+    finally:
+        if rejects_file:
+            rejects_file.close()
+        for conn in conns:
+            conn.close()
+
+    print(f"imported={state['imported']} rejected={state['rejected']}")
+    if renumbered:
+        print(f"user_machines: {renumbered} machine ids reassigned to avoid collisions")
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream player state to and from JSONL.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write every player as one JSON line")
+    p.add_argument("--source", nargs="+", default=DATABASE_SHARDS)
+    p.add_argument("-o", "--output", help="output file (default: stdout)")
+
+    p = sub.add_parser("import", help="load players from a JSONL file")
+    p.add_argument("input")
+    p.add_argument("--dest", nargs="+", default=DATABASE_SHARDS)
+    p.add_argument("--chunk", type=int, default=CHUNK_PLAYERS, help="players per transaction")
+    p.add_argument("--checkpoint", help="progress file (default: <input>.checkpoint)")
+    p.add_argument("--rejects", help="append lines that fail validation to this file")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        out = open(args.output, "w") if args.output else sys.stdout
+        try:
+            count = 0
+            for player in export_players(args.source):
+                out.write(json.dumps(player, separators=(",", ":")) + "\n")
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"exported={count}", file=sys.stderr)
+    elif args.command == "import":
+        import_players(args.input, args.dest, args.chunk, args.checkpoint, args.rejects)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,670 @@
+# storage.py
+#
+# Repository layer for player state (users, balances, machines, amplifier
+# timers). app.py only talks to a Storage object, so the game rules can run
+# against SQLite in production or against plain dicts in memory.
+#
+# Machines are returned as dicts with the user_machines column names:
+#   id, user_id, machine_type, x, y, level, last_activated, is_offline, next_cost_time
+#
+# Every write stamps the changed row with the player's next state version
+# (users.state_version), which lets /api/getGameState?since=<version> send
+# only what changed. Removed machines leave a tombstone; once old tombstones
+# are pruned, users.delta_floor records the oldest version a delta can
+# still be computed from. Writes that bypass this layer (the Telegram bot
+# updating bot.db) are not stamped, which is why a delta always carries the
+# current balances.
+#
+# Connections wait up to DATABASE_BUSY_TIMEOUT_MS for a lock. Handlers
+# wrapped in retry_on_lock are re-run from the start, with backoff, when
+# SQLite still reports the database as locked (e.g. a read transaction that
+# cannot be upgraded to a write, which SQLite fails without waiting).
+
+import functools
+import random
+import sqlite3
+import threading
+import time
+
+from config import (
+    DATABASE_PATH, DATABASE_SHARDS, STORAGE_BACKEND,
+    DATABASE_BUSY_TIMEOUT_MS, DATABASE_LOCK_RETRIES, DATABASE_RETRY_BACKOFF_MS,
+)
+from sharding import shard_path
+
+MACHINE_COLUMNS = (
+    "id", "user_id", "machine_type", "x", "y", "level",
+    "last_activated", "is_offline", "next_cost_time",
+)
+MACHINE_FIELDS = MACHINE_COLUMNS[3:]
+USER_COLUMNS = ("user_id", "first_name", "corvax_count")
+
+TOMBSTONES_KEPT = 100
+
+class DatabaseBusy(Exception):
+    # Raised by retry_on_lock once every attempt found the database locked.
+    pass
+
+def is_lock_error(exc):
+    msg = str(exc)
+    return isinstance(exc, sqlite3.OperationalError) and (
+        "database is locked" in msg or "database table is locked" in msg or "database is busy" in msg)
+
+def retry_on_lock(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DATABASE_LOCK_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as exc:
+                if not is_lock_error(exc):
+                    raise
+                if attempt == DATABASE_LOCK_RETRIES:
+                    raise DatabaseBusy(str(exc)) from exc
+                # Full jitter keeps retrying workers from colliding again.
+                time.sleep(random.uniform(0, DATABASE_RETRY_BACKOFF_MS * 2 ** attempt) / 1000)
+    return wrapper
+
+class Storage:
+    def get_user(self, user_id):
+        raise NotImplementedError
+
+    def create_user(self, user_id, first_name):
+        raise NotImplementedError
+
+    def set_corvax(self, user_id, amount):
+        raise NotImplementedError
+
+    def get_resource(self, user_id, resource_name):
+        # Returns the balance, creating a zero row if the user has none yet.
+        raise NotImplementedError
+
+    def set_resource(self, user_id, resource_name, amount):
+        raise NotImplementedError
+
+    def list_machines(self, user_id, machine_type=None):
+        # Ordered by id, i.e. build order.
+        raise NotImplementedError
+
+    def get_machine(self, user_id, machine_id):
+        raise NotImplementedError
+
+    def count_machines(self, user_id, machine_type):
+        raise NotImplementedError
+
+    def add_machine(self, user_id, machine_type, x, y, level=1,
+                    last_activated=0, is_offline=0, next_cost_time=0):
+        raise NotImplementedError
+
+    def update_machine(self, user_id, machine_id, **fields):
+        raise NotImplementedError
+
+    def delete_machine(self, user_id, machine_id):
+        raise NotImplementedError
+
+    def get_state_version(self, user_id):
+        # Returns {"version": ..., "floor": ...} or None for unknown users.
+        raise NotImplementedError
+
+    def get_account(self, user_id):
+        # The Radix account the player proved they own, or None.
+        raise NotImplementedError
+
+    def set_account(self, user_id, address):
+        # Raises sqlite3.IntegrityError if another player holds the account.
+        raise NotImplementedError
+
+    def find_user_by_account(self, address):
+        # Returns the user_id the account is bound to, or None.
+        raise NotImplementedError
+
+    def changes_since(self, user_id, since):
+        # Returns {"machines": [...], "removed": [ids], "balances": {name: amount}}
+        # for everything stamped with a version greater than since.
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def _add_column(conn, table, column, decl):
+    existing = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def ensure_schema(conn):
+    # Creates the player tables in an empty file, adds the delta-sync columns
+    # to databases created before they existed, and switches the file to WAL
+    # so readers never block the writer. Runs under BEGIN IMMEDIATE: workers
+    # starting together against an old file would otherwise race between
+    # the column check and the ALTER, and the loser would fail with
+    # "duplicate column name".
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _migrate(conn)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def _migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            corvax_count REAL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resources (
+            user_id INTEGER,
+            resource_name TEXT,
+            amount REAL,
+            PRIMARY KEY (user_id, resource_name)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_machines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            machine_type TEXT,
+            x INTEGER,
+            y INTEGER,
+            level INTEGER,
+            last_activated INTEGER,
+            is_offline INTEGER,
+            next_cost_time INTEGER
+        )
+    """)
+    _add_column(conn, "users", "state_version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "users", "corvax_version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "users", "delta_floor", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "resources", "version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "user_machines", "version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "users", "radix_account", "TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS machine_tombstones (
+            user_id INTEGER NOT NULL,
+            machine_id INTEGER NOT NULL,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_machine_tombstones_user ON machine_tombstones (user_id, version)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_machines_user_version ON user_machines (user_id, version)")
+    # Account -> player registry. Only the first shard's copy is used, so one
+    # account maps to one player across all shards (see claim_account).
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_accounts (
+            radix_account TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_wallet_accounts_user ON wallet_accounts (user_id)")
+
+class SQLiteStorage(Storage):
+    def __init__(self, path=DATABASE_PATH):
+        self.conn = sqlite3.connect(path, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.cur = self.conn.cursor()
+        self.versions = {}
+        if path not in _schema_ready:
+            with _schema_lock:
+                if path not in _schema_ready:
+                    ensure_schema(self.conn)
+                    _schema_ready.add(path)
+
+    def _version(self, user_id):
+        # One version per user per transaction; commit() starts a new one.
+        key = _key(user_id)
+        if key not in self.versions:
+            self.cur.execute("UPDATE users SET state_version=state_version+1 WHERE user_id=?", (user_id,))
+            self.cur.execute("SELECT state_version FROM users WHERE user_id=?", (user_id,))
+            row = self.cur.fetchone()
+            self.versions[key] = row[0] if row else 0
+        return self.versions[key]
+
+    def get_user(self, user_id):
+        self.cur.execute("SELECT user_id, first_name, corvax_count FROM users WHERE user_id=?", (user_id,))
+        row = self.cur.fetchone()
+        return dict(row) if row else None
+
+    def create_user(self, user_id, first_name):
+        self.cur.execute(
+            "INSERT INTO users (user_id, first_name, corvax_count) VALUES (?, ?, 0)",
+            (user_id, first_name)
+        )
+
+    def set_corvax(self, user_id, amount):
+        self.cur.execute("UPDATE users SET corvax_count=?, corvax_version=? WHERE user_id=?",
+                         (amount, self._version(user_id), user_id))
+
+    def get_resource(self, user_id, resource_name):
+        self.cur.execute("SELECT amount FROM resources WHERE user_id=? AND resource_name=?",
+                         (user_id, resource_name))
+        row = self.cur.fetchone()
+        if row is None:
+            self.cur.execute("INSERT INTO resources (user_id, resource_name, amount) VALUES (?, ?, 0)",
+                             (user_id, resource_name))
+            return 0
+        return row[0]
+
+    def set_resource(self, user_id, resource_name, amount):
+        version = self._version(user_id)
+        self.cur.execute("UPDATE resources SET amount=?, version=? WHERE user_id=? AND resource_name=?",
+                         (amount, version, user_id, resource_name))
+        if self.cur.rowcount == 0:
+            self.cur.execute("""
+                INSERT INTO resources (user_id, resource_name, amount, version)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, resource_name, amount, version))
+
+    def list_machines(self, user_id, machine_type=None):
+        cols = ", ".join(MACHINE_COLUMNS)
+        if machine_type is None:
+            self.cur.execute(f"SELECT {cols} FROM user_machines WHERE user_id=? ORDER BY id",
+                             (user_id,))
+        else:
+            self.cur.execute(f"""
+                SELECT {cols} FROM user_machines
+                WHERE user_id=? AND machine_type=?
+                ORDER BY id
+            """, (user_id, machine_type))
+        return [dict(r) for r in self.cur.fetchall()]
+
+    def get_machine(self, user_id, machine_id):
+        cols = ", ".join(MACHINE_COLUMNS)
+        self.cur.execute(f"SELECT {cols} FROM user_machines WHERE user_id=? AND id=?",
+                         (user_id, machine_id))
+        row = self.cur.fetchone()
+        return dict(row) if row else None
+
+    def count_machines(self, user_id, machine_type):
+        self.cur.execute("""
+            SELECT COUNT(*) FROM user_machines
+            WHERE user_id=? AND machine_type=?
+        """, (user_id, machine_type))
+        return self.cur.fetchone()[0]
+
+    def add_machine(self, user_id, machine_type, x, y, level=1,
+                    last_activated=0, is_offline=0, next_cost_time=0):
+        self.cur.execute("""
+            INSERT INTO user_machines
+            (user_id, machine_type, x, y, level, last_activated, is_offline, next_cost_time, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, machine_type, x, y, level, last_activated, is_offline, next_cost_time,
+              self._version(user_id)))
+        return self.cur.lastrowid
+
+    def update_machine(self, user_id, machine_id, **fields):
+        unknown = set(fields) - set(MACHINE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown machine fields: {sorted(unknown)}")
+        if not fields:
+            return
+        assignments = ", ".join(f"{name}=?" for name in fields)
+        self.cur.execute(f"UPDATE user_machines SET {assignments}, version=? WHERE user_id=? AND id=?",
+                         (*fields.values(), self._version(user_id), user_id, machine_id))
+
+    def delete_machine(self, user_id, machine_id):
+        self.cur.execute("DELETE FROM user_machines WHERE user_id=? AND id=?", (user_id, machine_id))
+        if self.cur.rowcount == 0:
+            return False
+        self.cur.execute("INSERT INTO machine_tombstones (user_id, machine_id, version) VALUES (?, ?, ?)",
+                         (user_id, machine_id, self._version(user_id)))
+        self.cur.execute("""
+            SELECT version FROM machine_tombstones
+            WHERE user_id=?
+            ORDER BY version DESC
+            LIMIT 1 OFFSET ?
+        """, (user_id, TOMBSTONES_KEPT))
+        row = self.cur.fetchone()
+        if row:
+            cutoff = row[0]
+            self.cur.execute("DELETE FROM machine_tombstones WHERE user_id=? AND version<=?",
+                             (user_id, cutoff))
+            self.cur.execute("UPDATE users SET delta_floor=MAX(delta_floor, ?) WHERE user_id=?",
+                             (cutoff, user_id))
+        return True
+
+    def get_state_version(self, user_id):
+        self.cur.execute("SELECT state_version, delta_floor FROM users WHERE user_id=?", (user_id,))
+        row = self.cur.fetchone()
+        return {"version": row[0], "floor": row[1]} if row else None
+
+    def get_account(self, user_id):
+        self.cur.execute("SELECT radix_account FROM users WHERE user_id=?", (user_id,))
+        row = self.cur.fetchone()
+        return row[0] if row else None
+
+    def set_account(self, user_id, address):
+        self.claim_account(user_id, address)
+        self.store_account(user_id, address)
+
+    def claim_account(self, user_id, address):
+        # Registers address to user_id in wallet_accounts, dropping the
+        # player's previous account. The DELETE takes the write lock first,
+        # so concurrent claims of one account are serialized.
+        self.cur.execute("DELETE FROM wallet_accounts WHERE user_id=? AND radix_account IS NOT ?",
+                         (user_id, address))
+        if address is None:
+            return
+        self.cur.execute("INSERT OR IGNORE INTO wallet_accounts (radix_account, user_id) VALUES (?, ?)",
+                         (address, user_id))
+        owner = self.find_user_by_account(address)
+        if str(owner) != str(user_id):
+            raise sqlite3.IntegrityError(f"account {address} is bound to another player")
+
+    def store_account(self, user_id, address):
+        self.cur.execute("UPDATE users SET radix_account=? WHERE user_id=?", (address, user_id))
+
+    def find_user_by_account(self, address):
+        self.cur.execute("SELECT user_id FROM wallet_accounts WHERE radix_account=?", (address,))
+        row = self.cur.fetchone()
+        return row[0] if row else None
+
+    def changes_since(self, user_id, since):
+        cols = ", ".join(MACHINE_COLUMNS)
+        self.cur.execute(f"""
+            SELECT {cols} FROM user_machines
+            WHERE user_id=? AND version>?
+            ORDER BY id
+        """, (user_id, since))
+        machines = [dict(r) for r in self.cur.fetchall()]
+
+        self.cur.execute("SELECT machine_id FROM machine_tombstones WHERE user_id=? AND version>?",
+                         (user_id, since))
+        removed = [r[0] for r in self.cur.fetchall()]
+
+        balances = {}
+        self.cur.execute("SELECT corvax_count FROM users WHERE user_id=? AND corvax_version>?",
+                         (user_id, since))
+        row = self.cur.fetchone()
+        if row:
+            balances["tcorvax"] = row[0]
+        self.cur.execute("SELECT resource_name, amount FROM resources WHERE user_id=? AND version>?",
+                         (user_id, since))
+        for name, amount in self.cur.fetchall():
+            balances[name] = amount
+
+        return {"machines": machines, "removed": removed, "balances": balances}
+
+    def commit(self):
+        self.conn.commit()
+        self.versions = {}
+
+    def close(self):
+        self.cur.close()
+        self.conn.close()
+
+class ShardedStorage(Storage):
+    # Routes every call to the shard owning user_id, opening shard
+    # connections lazily; handlers use it exactly like SQLiteStorage.
+
+    def __init__(self, shards=None):
+        self.shards = shards or DATABASE_SHARDS
+        self.open = {}
+
+    def _for(self, user_id):
+        return self._shard(shard_path(user_id, self.shards))
+
+    def _shard(self, path):
+        if path not in self.open:
+            self.open[path] = SQLiteStorage(path)
+        return self.open[path]
+
+    def get_user(self, user_id):
+        return self._for(user_id).get_user(user_id)
+
+    def create_user(self, user_id, first_name):
+        self._for(user_id).create_user(user_id, first_name)
+
+    def set_corvax(self, user_id, amount):
+        self._for(user_id).set_corvax(user_id, amount)
+
+    def get_resource(self, user_id, resource_name):
+        return self._for(user_id).get_resource(user_id, resource_name)
+
+    def set_resource(self, user_id, resource_name, amount):
+        self._for(user_id).set_resource(user_id, resource_name, amount)
+
+    def list_machines(self, user_id, machine_type=None):
+        return self._for(user_id).list_machines(user_id, machine_type)
+
+    def get_machine(self, user_id, machine_id):
+        return self._for(user_id).get_machine(user_id, machine_id)
+
+    def count_machines(self, user_id, machine_type):
+        return self._for(user_id).count_machines(user_id, machine_type)
+
+    def add_machine(self, user_id, machine_type, x, y, level=1,
+                    last_activated=0, is_offline=0, next_cost_time=0):
+        return self._for(user_id).add_machine(user_id, machine_type, x, y, level,
+                                              last_activated, is_offline, next_cost_time)
+
+    def update_machine(self, user_id, machine_id, **fields):
+        self._for(user_id).update_machine(user_id, machine_id, **fields)
+
+    def delete_machine(self, user_id, machine_id):
+        return self._for(user_id).delete_machine(user_id, machine_id)
+
+    def get_state_version(self, user_id):
+        return self._for(user_id).get_state_version(user_id)
+
+    def changes_since(self, user_id, since):
+        return self._for(user_id).changes_since(user_id, since)
+
+    def get_account(self, user_id):
+        return self._for(user_id).get_account(user_id)
+
+    # The account registry lives on the first shard, so a claim there is
+    # checked against every player whichever shard they are on.
+    def set_account(self, user_id, address):
+        self._shard(self.shards[0]).claim_account(user_id, address)
+        self._for(user_id).store_account(user_id, address)
+
+    def find_user_by_account(self, address):
+        return self._shard(self.shards[0]).find_user_by_account(address)
+
+    def commit(self):
+        for store in self.open.values():
+            store.commit()
+
+    def close(self):
+        for store in self.open.values():
+            store.close()
+        self.open = {}
+
+def _key(value):
+    # Session ids arrive as strings, JSON ids as ints; SQLite treats both the
+    # same for INTEGER columns, so the memory backend does too.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+class MemoryDatabase:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = {}
+        self.resources = {}
+        self.machines = {}
+        self.tombstones = {}
+        self.next_machine_id = 1
+
+class MemoryStorage(Storage):
+    # Writes go straight to the shared MemoryDatabase; commit() only ends
+    # the current state version.
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else MemoryDatabase()
+        self.versions = {}
+
+    def _version(self, uid):
+        if uid not in self.versions:
+            with self.db.lock:
+                user = self.db.users.get(uid)
+                if user is None:
+                    self.versions[uid] = 0
+                else:
+                    user["state_version"] += 1
+                    self.versions[uid] = user["state_version"]
+        return self.versions[uid]
+
+    def get_user(self, user_id):
+        user = self.db.users.get(_key(user_id))
+        return {k: user[k] for k in USER_COLUMNS} if user else None
+
+    def create_user(self, user_id, first_name):
+        uid = _key(user_id)
+        with self.db.lock:
+            if uid in self.db.users:
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: users.user_id")
+            self.db.users[uid] = {
+                "user_id": uid,
+                "first_name": first_name,
+                "corvax_count": 0,
+                "state_version": 0,
+                "corvax_version": 0,
+                "delta_floor": 0,
+                "radix_account": None,
+            }
+
+    def set_corvax(self, user_id, amount):
+        uid = _key(user_id)
+        user = self.db.users.get(uid)
+        if user is not None:
+            user["corvax_count"] = amount
+            user["corvax_version"] = self._version(uid)
+
+    def get_resource(self, user_id, resource_name):
+        owned = self.db.resources.setdefault(_key(user_id), {})
+        return owned.setdefault(resource_name, {"amount": 0, "version": 0})["amount"]
+
+    def set_resource(self, user_id, resource_name, amount):
+        uid = _key(user_id)
+        self.db.resources.setdefault(uid, {})[resource_name] = {"amount": amount, "version": self._version(uid)}
+
+    def _public(self, m):
+        return {k: m[k] for k in MACHINE_COLUMNS}
+
+    def list_machines(self, user_id, machine_type=None):
+        owned = self.db.machines.get(_key(user_id), {})
+        return [self._public(m) for _, m in sorted(owned.items())
+                if machine_type is None or m["machine_type"] == machine_type]
+
+    def get_machine(self, user_id, machine_id):
+        m = self.db.machines.get(_key(user_id), {}).get(_key(machine_id))
+        return self._public(m) if m else None
+
+    def count_machines(self, user_id, machine_type):
+        owned = self.db.machines.get(_key(user_id), {})
+        return sum(1 for m in owned.values() if m["machine_type"] == machine_type)
+
+    def add_machine(self, user_id, machine_type, x, y, level=1,
+                    last_activated=0, is_offline=0, next_cost_time=0):
+        uid = _key(user_id)
+        with self.db.lock:
+            machine_id = self.db.next_machine_id
+            self.db.next_machine_id += 1
+            self.db.machines.setdefault(uid, {})[machine_id] = {
+                "id": machine_id,
+                "user_id": uid,
+                "machine_type": machine_type,
+                "x": x,
+                "y": y,
+                "level": level,
+                "last_activated": last_activated,
+                "is_offline": is_offline,
+                "next_cost_time": next_cost_time,
+                "version": self._version(uid),
+            }
+        return machine_id
+
+    def update_machine(self, user_id, machine_id, **fields):
+        unknown = set(fields) - set(MACHINE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown machine fields: {sorted(unknown)}")
+        uid = _key(user_id)
+        m = self.db.machines.get(uid, {}).get(_key(machine_id))
+        if m is not None:
+            m.update(fields)
+            m["version"] = self._version(uid)
+
+    def delete_machine(self, user_id, machine_id):
+        uid = _key(user_id)
+        with self.db.lock:
+            m = self.db.machines.get(uid, {}).pop(_key(machine_id), None)
+            if m is None:
+                return False
+            stones = self.db.tombstones.setdefault(uid, [])
+            stones.append((m["id"], self._version(uid)))
+            if len(stones) > TOMBSTONES_KEPT:
+                cutoff = stones[-TOMBSTONES_KEPT - 1][1]
+                stones[:] = [s for s in stones if s[1] > cutoff]
+                user = self.db.users.get(uid)
+                if user is not None:
+                    user["delta_floor"] = max(user["delta_floor"], cutoff)
+        return True
+
+    def get_state_version(self, user_id):
+        user = self.db.users.get(_key(user_id))
+        return {"version": user["state_version"], "floor": user["delta_floor"]} if user else None
+
+    def get_account(self, user_id):
+        user = self.db.users.get(_key(user_id))
+        return user["radix_account"] if user else None
+
+    def set_account(self, user_id, address):
+        owner = self.find_user_by_account(address)
+        if owner is not None and owner != _key(user_id):
+            raise sqlite3.IntegrityError(f"account {address} is bound to another player")
+        user = self.db.users.get(_key(user_id))
+        if user is not None:
+            user["radix_account"] = address
+
+    def find_user_by_account(self, address):
+        for uid, user in self.db.users.items():
+            if address is not None and user["radix_account"] == address:
+                return uid
+        return None
+
+    def changes_since(self, user_id, since):
+        uid = _key(user_id)
+        owned = self.db.machines.get(uid, {})
+        machines = [self._public(m) for _, m in sorted(owned.items()) if m["version"] > since]
+        removed = [mid for mid, v in self.db.tombstones.get(uid, []) if v > since]
+        balances = {}
+        user = self.db.users.get(uid)
+        if user is not None and user["corvax_version"] > since:
+            balances["tcorvax"] = user["corvax_count"]
+        for name, row in self.db.resources.get(uid, {}).items():
+            if row["version"] > since:
+                balances[name] = row["amount"]
+        return {"machines": machines, "removed": removed, "balances": balances}
+
+    def commit(self):
+        self.versions = {}
+
+_memory_db = MemoryDatabase()
+
+def open_storage(backend=None):
+    backend = backend or STORAGE_BACKEND
+    if backend == "sqlite":
+        if len(DATABASE_SHARDS) > 1:
+            return ShardedStorage()
+        return SQLiteStorage(DATABASE_SHARDS[0])
+    if backend == "memory":
+        return MemoryStorage(_memory_db)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
@@ -0,0 +1,13 @@
+# tests/conftest.py
+#
+# The app is a set of flat top-level modules; make them importable.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep request logs of app tests out of the working tree.
+if "LOG_DIR" not in os.environ:
+    import tempfile
+    os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="cvxlab-logs-")
@@ -0,0 +1,69 @@
+# tests/test_serving.py
+
+import multiprocessing
+import sqlite3
+import threading
+
+from flask import Flask
+
+from serving import install_load_shedding
+from storage import ensure_schema
+
+def test_static_files_bypass_admission():
+    app = Flask(__name__)
+    entered, release = threading.Event(), threading.Event()
+
+    @app.route("/api/slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        return "ok"
+
+    @app.route("/api/fast")
+    def fast():
+        return "ok"
+
+    @app.route("/<path:path>")
+    def serve(path):
+        return "asset"
+
+    install_load_shedding(app, limit=1)
+    client = app.test_client()
+    worker = threading.Thread(target=lambda: app.test_client().get("/api/slow"))
+    worker.start()
+    try:
+        assert entered.wait(5)
+        assert client.get("/api/fast").status_code == 503
+        assert client.get("/assets/index.js").status_code == 200
+    finally:
+        release.set()
+        worker.join(5)
+    assert client.get("/api/fast").status_code == 200
+
+def _migrate(path, start):
+    start.wait(5)
+    conn = sqlite3.connect(path, timeout=10)
+    ensure_schema(conn)
+    conn.close()
+
+def test_concurrent_schema_migration(tmp_path):
+    path = str(tmp_path / "bot.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_name TEXT, corvax_count REAL)")
+    conn.commit()
+    conn.close()
+
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Event()
+    workers = [ctx.Process(target=_migrate, args=(path, start)) for _ in range(6)]
+    for p in workers:
+        p.start()
+    start.set()
+    for p in workers:
+        p.join(20)
+
+    assert [p.exitcode for p in workers] == [0] * 6
+    conn = sqlite3.connect(path)
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(users)")]
+    conn.close()
+    assert columns.count("state_version") == 1
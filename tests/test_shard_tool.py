@@ -0,0 +1,87 @@
+# tests/test_shard_tool.py
+
+import sqlite3
+
+import pytest
+
+from sharding import shard_index
+from shard_tool import migrate, verify
+from storage import SQLiteStorage
+
+# A bot.db from before the delta-sync columns and tombstones existed.
+BASELINE = """
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_name TEXT, corvax_count REAL DEFAULT 0);
+CREATE TABLE resources (user_id INTEGER, resource_name TEXT, amount REAL,
+                        PRIMARY KEY (user_id, resource_name));
+CREATE TABLE user_machines (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                            machine_type TEXT, x INTEGER, y INTEGER, level INTEGER,
+                            last_activated INTEGER, is_offline INTEGER, next_cost_time INTEGER);
+"""
+
+def baseline_db(path, users):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE)
+    for uid in users:
+        conn.execute("INSERT INTO users VALUES (?, ?, 10)", (uid, f"p{uid}"))
+        conn.execute("INSERT INTO resources VALUES (?, 'catNips', 1)", (uid,))
+        conn.execute("""
+            INSERT INTO user_machines (user_id, machine_type, x, y, level, last_activated, is_offline, next_cost_time)
+            VALUES (?, 'catLair', 0, 0, 1, 0, 0, 0)
+        """, (uid,))
+    conn.commit()
+    conn.close()
+    return str(path)
+
+def test_migrate_keeps_extra_source_columns(tmp_path):
+    src = baseline_db(tmp_path / "bot.db", range(1, 6))
+    conn = sqlite3.connect(src)
+    conn.execute("ALTER TABLE users ADD COLUMN username TEXT")
+    conn.execute("UPDATE users SET username='u' || user_id")
+    conn.commit()
+    conn.close()
+    dests = [str(tmp_path / f"shard{i}.db") for i in range(2)]
+
+    migrate([src], dests)
+
+    assert verify([src], dests)
+    names = set()
+    for path in dests:
+        conn = sqlite3.connect(path)
+        names |= {r[0] for r in conn.execute("SELECT username FROM users")}
+        conn.close()
+    assert names == {f"u{i}" for i in range(1, 6)}
+
+def test_migrate_and_verify_baseline_db(tmp_path):
+    src = baseline_db(tmp_path / "bot.db", range(1, 21))
+    dests = [str(tmp_path / f"shard{i}.db") for i in range(3)]
+
+    migrate([src], dests)
+
+    assert verify([src], dests)
+
+# Users 1 and 2 land on the same destination (index 1 of 2), so with two
+# destinations the collision happens outside the first one.
+@pytest.mark.parametrize("n_dests", [1, 2])
+def test_merge_renumbers_and_forces_full_reload(tmp_path, n_dests):
+    a = baseline_db(tmp_path / "a.db", [1])
+    b = baseline_db(tmp_path / "b.db", [2])
+    dests = [str(tmp_path / f"merged{i}.db") for i in range(n_dests)]
+    assert shard_index(1, n_dests) == shard_index(2, n_dests)
+
+    migrate([a, b], dests)
+
+    assert verify([a, b], dests)
+    store = SQLiteStorage(dests[shard_index(1, n_dests)])
+    try:
+        kept, moved = store.list_machines(1), store.list_machines(2)
+        assert [m["id"] for m in kept] == [1]
+        assert [m["id"] for m in moved] != [1]
+        # The owner of the renumbered machine can no longer get a delta
+        # from the version their client cached before the merge.
+        assert store.get_state_version(1) == {"version": 0, "floor": 0}
+        state = store.get_state_version(2)
+        assert state["floor"] > 0 and state["version"] >= state["floor"]
+        changed = store.changes_since(2, state["version"] - 1)["machines"]
+        assert [m["id"] for m in changed] == [m["id"] for m in moved]
+    finally:
+        store.close()
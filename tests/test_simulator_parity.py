@@ -0,0 +1,89 @@
+# tests/test_simulator_parity.py
+#
+# simulator.py re-implements two server rules in vectorized form instead of
+# looking them up in tables: the amplifier upkeep catch-up of
+# game_rules.settle_amplifier and the reactor Cat Nip gating of an
+# activation round. These tests run the scalar rules player by player on
+# random states and require the vectorized paths to agree.
+
+import numpy as np
+import pytest
+
+from game_rules import (
+    AMPLIFIER_UPKEEP_INTERVAL_MS, MAX_LEVEL, REACTOR_CATNIP_COST,
+    settle_amplifier, cat_lair_yield, reactor_yield,
+)
+from simulator import Economy, AMP, CAT0, CAT1, REA0, REA1, INC
+
+DAY = AMPLIFIER_UPKEEP_INTERVAL_MS
+N = 5000
+
+def _economy(seed):
+    econ = Economy(N, {"grinder": 1.0}, seed=seed)
+    econ.now_ms += 40 * DAY
+    return econ, np.random.default_rng(seed)
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_settle_amplifiers_matches_game_rules(seed):
+    econ, rng = _economy(seed)
+    now = econ.now_ms
+    econ.levels[:, AMP] = rng.integers(0, MAX_LEVEL["amplifier"] + 1, N)
+    econ.amp_offline[:] = rng.random(N) < 0.4
+    kind = rng.integers(0, 3, N)
+    econ.amp_next_cost[:] = np.select(
+        [kind == 0, kind == 1],
+        [0, now - rng.integers(0, 10 * DAY, N)],
+        now + rng.integers(1, DAY, N))
+    econ.balance[:, 2] = rng.integers(0, 60, N).astype(float)
+
+    built, reported_offline = econ.effective_amp_offline()
+    before = (econ.levels[:, AMP].copy(), econ.amp_offline.copy(),
+              econ.amp_next_cost.copy(), econ.balance[:, 2].copy())
+    econ._settle_amplifiers(np.arange(N))
+
+    for i in range(N):
+        level, offline, next_cost, energy = (int(before[0][i]), int(before[1][i]),
+                                             int(before[2][i]), float(before[3][i]))
+        if level == 0:
+            continue
+        exp_offline, exp_next, exp_energy = settle_amplifier(level, offline, next_cost, energy, now)
+        assert bool(econ.amp_offline[i]) == bool(exp_offline), i
+        assert bool(reported_offline[i]) == bool(exp_offline), i
+        assert econ.amp_next_cost[i] == exp_next, i
+        assert econ.balance[i, 2] == pytest.approx(exp_energy), i
+
+def _reference_session(levels, amp_online, balance, rounds):
+    # One session as the server sees it: every round clicks both lairs,
+    # then each reactor in build order while Cat Nips last.
+    tcorvax, catnips, energy = balance
+    amp_level = levels[AMP] if amp_online else 0
+    for _ in range(rounds):
+        for s in (CAT0, CAT1):
+            if levels[s]:
+                catnips += cat_lair_yield(levels[s])
+        for s in (REA0, REA1):
+            if levels[s] and catnips >= REACTOR_CATNIP_COST:
+                catnips -= REACTOR_CATNIP_COST
+                gained_t, gained_e = reactor_yield(levels[s], amp_level)
+                tcorvax += gained_t
+                energy += gained_e
+    return tcorvax, catnips, energy
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_activate_matches_game_rules(seed):
+    econ, rng = _economy(seed)
+    for s, name in ((CAT0, "catLair"), (CAT1, "catLair"), (REA0, "reactor"), (REA1, "reactor"),
+                    (AMP, "amplifier")):
+        econ.levels[:, s] = rng.integers(0, MAX_LEVEL[name] + 1, N)
+    econ.levels[:, INC] = 0
+    econ.amp_offline[:] = rng.random(N) < 0.3
+    econ.balance[:] = rng.integers(0, 20, (N, 3)).astype(float)
+    rounds = rng.integers(1, 30, N)
+
+    levels = econ.levels.copy()
+    balance = econ.balance.copy()
+    econ._activate(np.arange(N), rounds)
+
+    for i in range(N):
+        expected = _reference_session(levels[i], not econ.amp_offline[i], balance[i], int(rounds[i]))
+        assert econ.balance[i] == pytest.approx(expected), i
@@ -0,0 +1,115 @@
+# tests/test_staking.py
+
+import threading
+import time
+
+import pytest
+
+from staking import StakedBalanceService, StaticFetcher
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FailingFetcher(StaticFetcher):
+    def __init__(self, balances=None):
+        super().__init__(balances)
+        self.fail = False
+
+    def fetch_many(self, addresses):
+        if self.fail:
+            raise OSError("gateway down")
+        return super().fetch_many(addresses)
+
+class BlockingFetcher(StaticFetcher):
+    def __init__(self, balances=None):
+        super().__init__(balances)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def fetch_many(self, addresses):
+        self.entered.set()
+        self.release.wait(5)
+        return super().fetch_many(addresses)
+
+def service(fetcher, **kw):
+    clock = Clock()
+    return StakedBalanceService(fetcher, ttl=60, clock=clock, **kw), clock
+
+def test_cached_until_ttl_expires():
+    fetcher = StaticFetcher({"a": 5})
+    svc, clock = service(fetcher)
+
+    assert svc.get("a") == 5.0
+    fetcher.balances["a"] = 7
+    clock.now += 59
+    assert svc.get("a") == 5.0
+    assert fetcher.calls == 1
+
+    clock.now += 1
+    assert svc.get("a") == 7.0
+    assert fetcher.calls == 2
+
+def test_concurrent_lookups_share_one_fetch():
+    fetcher = BlockingFetcher({"a": 3})
+    svc, _ = service(fetcher)
+    results = []
+    first = threading.Thread(target=lambda: results.append(svc.get("a")))
+    first.start()
+    assert fetcher.entered.wait(5)
+    others = [threading.Thread(target=lambda: results.append(svc.get("a"))) for _ in range(7)]
+    for t in others:
+        t.start()
+    time.sleep(0.05)  # let them reach the pending fetch
+    fetcher.release.set()
+    for t in [first] + others:
+        t.join(5)
+
+    assert results == [3.0] * 8
+    assert fetcher.calls == 1
+
+def test_refresh_due_batches_and_drops_idle_entries():
+    fetcher = StaticFetcher({a: i for i, a in enumerate("abcde")})
+    fetcher.max_batch = 2
+    svc, clock = service(fetcher, refresh_ahead=15, idle_after=100)
+    for a in "abcde":
+        svc.get(a)
+    fetcher.calls = 0
+
+    clock.now += 10
+    assert svc.refresh_due() == 0
+    assert fetcher.calls == 0
+
+    # All five are within refresh_ahead of expiry: three batches of <= 2.
+    clock.now += 40
+    assert svc.refresh_due() == 5
+    assert fetcher.calls == 3
+
+    # Refreshing does not count as use, so idle entries still age out.
+    clock.now += 60
+    svc.get("a")
+    svc.refresh_due()
+    assert list(svc.cache) == ["a"]
+
+def test_cache_keeps_most_recently_used():
+    svc, _ = service(StaticFetcher(), max_entries=3)
+    for a in "abc":
+        svc.get(a)
+    svc.get("a")
+    svc.get("d")
+
+    assert list(svc.cache) == ["c", "a", "d"]
+
+def test_falls_back_to_stale_value_when_fetch_fails():
+    fetcher = FailingFetcher({"a": 4})
+    svc, clock = service(fetcher)
+    assert svc.get("a") == 4.0
+
+    fetcher.fail = True
+    clock.now += 120
+    assert svc.get("a") == 4.0
+    with pytest.raises(OSError):
+        svc.get("unknown")
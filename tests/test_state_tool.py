@@ -0,0 +1,72 @@
+# tests/test_state_tool.py
+
+import json
+
+from state_tool import export_players, import_players
+from storage import SQLiteStorage
+
+PLAYER = {
+    "user_id": 42, "first_name": "Ann", "corvax_count": 120.0,
+    "radix_account": "account_rdx1ann",
+    "resources": {"catNips": 4.0, "energy": 2.0},
+    "machines": [{"id": 7, "machine_type": "catLair", "x": 0, "y": 0, "level": 1,
+                  "last_activated": 0, "is_offline": 0, "next_cost_time": 0}],
+}
+
+def test_import_into_empty_files(tmp_path):
+    src = tmp_path / "players.jsonl"
+    src.write_text(json.dumps(PLAYER) + "\n")
+    dests = [str(tmp_path / "shard0.db"), str(tmp_path / "shard1.db")]
+
+    state = import_players(str(src), dests)
+
+    assert state["imported"] == 1 and state["rejected"] == 0
+    assert list(export_players(dests)) == [PLAYER]
+
+def test_reimport_keeps_wallet_binding(tmp_path):
+    # Export, then restore over the same file: the bound wallet survives.
+    dest = str(tmp_path / "shard0.db")
+    src = tmp_path / "players.jsonl"
+    src.write_text(json.dumps(PLAYER) + "\n")
+    import_players(str(src), [dest])
+
+    backup = tmp_path / "backup.jsonl"
+    backup.write_text("".join(json.dumps(p) + "\n" for p in export_players([dest])))
+    import_players(str(backup), [dest])
+
+    store = SQLiteStorage(dest)
+    try:
+        assert store.get_account(42) == "account_rdx1ann"
+        assert store.find_user_by_account("account_rdx1ann") == 42
+    finally:
+        store.close()
+
+def test_import_keeps_one_player_per_wallet(tmp_path):
+    dests = [str(tmp_path / "shard0.db"), str(tmp_path / "shard1.db")]
+    src = tmp_path / "players.jsonl"
+    src.write_text(json.dumps(PLAYER) + "\n" + json.dumps(dict(PLAYER, user_id=4)) + "\n")
+
+    import_players(str(src), dests)
+
+    accounts = {p["user_id"]: p["radix_account"] for p in export_players(dests)}
+    assert accounts == {42: "account_rdx1ann", 4: None}
+
+def test_malformed_players_are_rejected(tmp_path):
+    machine = PLAYER["machines"][0]
+    bad = [
+        dict(PLAYER, user_id=1, machines=[5]),
+        dict(PLAYER, user_id=2, machines=[dict(machine, id="a"), dict(machine, id=2)]),
+        dict(PLAYER, user_id=3, machines=[dict(machine, x="left")]),
+        dict(PLAYER, user_id=4, machines=[dict(machine, last_activated=None)]),
+        dict(PLAYER, user_id=5, resources=[1]),
+        dict(PLAYER, user_id=6, radix_account=7),
+    ]
+    src = tmp_path / "players.jsonl"
+    src.write_text("".join(json.dumps(p) + "\n" for p in bad + [PLAYER]))
+    rejects = tmp_path / "rejects.jsonl"
+
+    state = import_players(str(src), [str(tmp_path / "shard0.db")], rejects=str(rejects))
+
+    assert state["imported"] == 1 and state["rejected"] == len(bad)
+    assert [json.loads(line)["user_id"] for line in rejects.read_text().splitlines()] == [1, 2, 3, 4, 5, 6]
+    assert [p["user_id"] for p in export_players([str(tmp_path / "shard0.db")])] == [42]
@@ -0,0 +1,188 @@
+# tests/test_storage.py
+#
+# Conformance suite: every Storage backend must behave the same through the
+# interface app.py uses.
+
+import sqlite3
+
+import pytest
+
+import storage
+from storage import MemoryDatabase, MemoryStorage, ShardedStorage, SQLiteStorage
+
+SCHEMA = """
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_name TEXT, corvax_count REAL DEFAULT 0);
+CREATE TABLE resources (user_id INTEGER, resource_name TEXT, amount REAL,
+                        PRIMARY KEY (user_id, resource_name));
+CREATE TABLE user_machines (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                            machine_type TEXT, x INTEGER, y INTEGER, level INTEGER,
+                            last_activated INTEGER, is_offline INTEGER, next_cost_time INTEGER);
+"""
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        path = str(tmp_path / "bot.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        s = SQLiteStorage(path)
+    else:
+        s = MemoryStorage(MemoryDatabase())
+    s.create_user(42, "Ann")
+    s.commit()
+    yield s
+    s.close()
+
+def test_get_user(store):
+    assert store.get_user(42) == {"user_id": 42, "first_name": "Ann", "corvax_count": 0}
+    assert store.get_user("42") == store.get_user(42)
+    assert store.get_user(7) is None
+
+def test_create_user_duplicate_raises(store):
+    with pytest.raises(sqlite3.IntegrityError):
+        store.create_user(42, "Again")
+
+def test_get_resource_creates_row(store):
+    assert store.get_resource(42, "catNips") == 0
+    store.commit()
+    assert store.changes_since(42, -1)["balances"]["catNips"] == 0
+    store.set_resource(42, "catNips", 12.5)
+    store.commit()
+    assert store.get_resource(42, "catNips") == 12.5
+
+def test_list_machines_in_build_order(store):
+    first = store.add_machine(42, "reactor", 150, 0)
+    second = store.add_machine(42, "catLair", 0, 0)
+    third = store.add_machine(42, "reactor", 300, 0, level=2)
+    store.add_machine(7, "catLair", 0, 0)
+    store.commit()
+
+    assert [m["id"] for m in store.list_machines(42)] == [first, second, third]
+    assert [m["id"] for m in store.list_machines(42, "reactor")] == [first, third]
+    assert store.count_machines(42, "reactor") == 2
+    m = store.get_machine(42, third)
+    assert (m["machine_type"], m["x"], m["level"], m["is_offline"]) == ("reactor", 300, 2, 0)
+    assert store.get_machine(7, third) is None
+
+def test_update_machine(store):
+    mid = store.add_machine(42, "amplifier", 0, 0)
+    store.update_machine(42, mid, level=3, is_offline=1)
+    store.commit()
+    m = store.get_machine(42, mid)
+    assert (m["level"], m["is_offline"]) == (3, 1)
+
+    with pytest.raises(ValueError):
+        store.update_machine(42, mid, id=7)
+    with pytest.raises(ValueError):
+        store.update_machine(42, mid, bogus=1)
+
+def test_one_version_per_transaction(store):
+    start = store.get_state_version(42)["version"]
+    store.set_corvax(42, 100)
+    store.set_resource(42, "energy", 3)
+    mid = store.add_machine(42, "catLair", 0, 0)
+    store.commit()
+    v1 = store.get_state_version(42)["version"]
+    assert v1 == start + 1
+
+    store.update_machine(42, mid, x=50)
+    store.commit()
+    v2 = store.get_state_version(42)["version"]
+    assert v2 == v1 + 1
+    assert store.get_state_version(7) is None
+
+def test_changes_since(store):
+    keep = store.add_machine(42, "catLair", 0, 0)
+    moved = store.add_machine(42, "reactor", 150, 0)
+    store.set_corvax(42, 100)
+    store.set_resource(42, "energy", 3)
+    store.commit()
+    since = store.get_state_version(42)["version"]
+
+    assert store.changes_since(42, since) == {"machines": [], "removed": [], "balances": {}}
+
+    store.update_machine(42, moved, x=300)
+    store.set_resource(42, "catNips", 9)
+    store.commit()
+    changes = store.changes_since(42, since)
+    assert [m["id"] for m in changes["machines"]] == [moved]
+    assert changes["machines"][0]["x"] == 300
+    assert changes["balances"] == {"catNips": 9}
+    assert changes["removed"] == []
+
+    full = store.changes_since(42, 0)
+    assert [m["id"] for m in full["machines"]] == [keep, moved]
+    assert full["balances"] == {"tcorvax": 100, "energy": 3, "catNips": 9}
+
+def test_delete_machine_leaves_tombstone(store):
+    mid = store.add_machine(42, "catLair", 0, 0)
+    store.commit()
+    since = store.get_state_version(42)["version"]
+
+    assert store.delete_machine(42, mid) is True
+    assert store.delete_machine(42, mid) is False
+    store.commit()
+    assert store.get_machine(42, mid) is None
+    assert store.changes_since(42, since)["removed"] == [mid]
+
+def test_tombstone_pruning_raises_floor(store, monkeypatch):
+    monkeypatch.setattr(storage, "TOMBSTONES_KEPT", 3)
+    versions = []
+    for _ in range(5):
+        mid = store.add_machine(42, "catLair", 0, 0)
+        store.commit()
+        store.delete_machine(42, mid)
+        store.commit()
+        versions.append(store.get_state_version(42)["version"])
+
+    state = store.get_state_version(42)
+    # Only the newest three deletions can still be reported.
+    assert state["floor"] == versions[1]
+    assert len(store.changes_since(42, state["floor"])["removed"]) == 3
+
+def test_wallet_account(store):
+    store.create_user(43, "Bob")
+    assert store.get_account(42) is None
+    assert store.find_user_by_account("account_rdx1a") is None
+
+    store.set_account(42, "account_rdx1a")
+    store.commit()
+    assert store.get_account(42) == "account_rdx1a"
+    assert str(store.find_user_by_account("account_rdx1a")) == "42"
+    assert store.get_account(43) is None
+    with pytest.raises(sqlite3.IntegrityError):
+        store.set_account(43, "account_rdx1a")
+
+    # Rebinding moves the player to the new account and frees the old one.
+    store.set_account(42, "account_rdx1b")
+    store.commit()
+    assert store.find_user_by_account("account_rdx1a") is None
+    store.set_account(43, "account_rdx1a")
+    store.commit()
+    assert str(store.find_user_by_account("account_rdx1a")) == "43"
+
+def test_wallet_account_unique_across_shards(tmp_path):
+    # Users 1 and 4 live on different shards of two.
+    shards = []
+    for i in range(2):
+        path = str(tmp_path / f"shard{i}.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        shards.append(path)
+    first, second = ShardedStorage(shards), ShardedStorage(shards)
+    try:
+        first.create_user(1, "Ann")
+        first.create_user(4, "Bob")
+        first.commit()
+
+        first.set_account(1, "account_rdx1a")
+        first.commit()
+        with pytest.raises(sqlite3.IntegrityError):
+            second.set_account(4, "account_rdx1a")
+        assert second.get_account(4) is None
+        assert second.find_user_by_account("account_rdx1a") == 1
+    finally:
+        first.close()
+        second.close()
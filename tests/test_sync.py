@@ -0,0 +1,87 @@
+# tests/test_sync.py
+#
+# /api/getGameState?since=<version>: when a delta is sent and what it holds.
+
+import sqlite3
+
+import pytest
+
+import storage
+from storage import SQLiteStorage
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    import app as app_module
+
+    path = str(tmp_path / "bot.db")
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(storage, "DATABASE_SHARDS", [path])
+    monkeypatch.setitem(app_module.app.config, "SESSION_COOKIE_SECURE", False)
+
+    store = SQLiteStorage(path)
+    store.create_user(1, "Ann")
+    store.set_corvax(1, 100)
+    store.set_resource(1, "catNips", 4)
+    store.set_resource(1, "energy", 2)
+    mid = store.add_machine(1, "catLair", 0, 0)
+    store.commit()
+    store.close()
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as s:
+        s["telegram_id"] = "1"
+    client.path = path
+    client.machine = mid
+    return client
+
+def state(client, since=None):
+    resp = client.get("/api/getGameState", query_string={} if since is None else {"since": since})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+def sql(client, statement, *args):
+    conn = sqlite3.connect(client.path)
+    conn.execute(statement, args)
+    conn.commit()
+    conn.close()
+
+def test_delta_has_changed_machines_only(db):
+    full = state(db)
+    assert full["full"] is True and len(full["machines"]) == 1
+
+    store = SQLiteStorage(db.path)
+    store.update_machine(1, db.machine, x=3)
+    other = store.add_machine(1, "reactor", 5, 5)
+    store.commit()
+    store.close()
+
+    delta = state(db, full["version"])
+    assert delta["full"] is False and delta["version"] > full["version"]
+    assert sorted(m["id"] for m in delta["machines"]) == sorted([db.machine, other])
+    assert delta["removedMachineIds"] == []
+
+    assert state(db, delta["version"])["machines"] == []
+
+def test_delta_carries_balances_written_outside_storage(db):
+    version = state(db)["version"]
+    # The Telegram bot credits tCorvax straight into bot.db.
+    sql(db, "UPDATE users SET corvax_count=250 WHERE user_id=1")
+    sql(db, "UPDATE resources SET amount=9 WHERE user_id=1 AND resource_name='energy'")
+
+    delta = state(db, version)
+    assert delta["full"] is False
+    assert delta["balances"]["tcorvax"] == 250.0
+    assert delta["balances"]["energy"] == 9.0
+    assert "catNips" in delta["balances"]
+
+def test_since_below_floor_gets_full_state(db):
+    version = state(db)["version"]
+    sql(db, "UPDATE users SET delta_floor=? WHERE user_id=1", version + 1)
+    sql(db, "UPDATE users SET state_version=? WHERE user_id=1", version + 1)
+
+    resp = state(db, version)
+    assert resp["full"] is True and resp["tcorvax"] == 100.0
+
+def test_since_above_version_gets_full_state(db):
+    version = state(db)["version"]
+    assert state(db, version + 5)["full"] is True
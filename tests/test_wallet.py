@@ -0,0 +1,150 @@
+# tests/test_wallet.py
+#
+# Wallet binding: ROLA proof checks and the server only ever using the
+# account bound to the logged-in player.
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, utils
+
+import rola
+import staking
+import storage
+from rola import RolaError, signed_message_hash, verify_account_proof, virtual_account_address
+
+DAPP = "account_rdx129994zq674n4mturvkqz7cz9t7gmtn5sjspxv7py2ahqnpdvxjsqum"
+ORIGIN = "https://test.cvxlab.net"
+CHALLENGE = "ab" * 32
+
+def _raw(public_key, encoding=serialization.Encoding.Raw, fmt=serialization.PublicFormat.Raw):
+    return public_key.public_bytes(encoding, fmt)
+
+def ed25519_proof(challenge=CHALLENGE, origin=ORIGIN, address=None, key=None):
+    key = key or ed25519.Ed25519PrivateKey.generate()
+    public_key = _raw(key.public_key())
+    signature = key.sign(signed_message_hash(challenge, DAPP, origin))
+    return {
+        "type": "account",
+        "challenge": challenge,
+        "address": address or virtual_account_address("curve25519", public_key),
+        "proof": {"curve": "curve25519", "publicKey": public_key.hex(), "signature": signature.hex()},
+    }
+
+def secp256k1_proof(challenge=CHALLENGE):
+    key = ec.generate_private_key(ec.SECP256K1())
+    public_key = _raw(key.public_key(), serialization.Encoding.X962,
+                      serialization.PublicFormat.CompressedPoint)
+    der = key.sign(signed_message_hash(challenge, DAPP, ORIGIN), ec.ECDSA(utils.Prehashed(hashes.SHA256())))
+    r, s = utils.decode_dss_signature(der)
+    signature = b"\x00" + r.to_bytes(32, "big") + s.to_bytes(32, "big")
+    return {
+        "challenge": challenge,
+        "address": virtual_account_address("secp256k1", public_key),
+        "proof": {"curve": "secp256k1", "publicKey": public_key.hex(), "signature": signature.hex()},
+    }
+
+def no_owner_keys(address):
+    return None
+
+@pytest.mark.parametrize("make", [ed25519_proof, secp256k1_proof])
+def test_valid_proof_for_virtual_account(make):
+    signed = make()
+    assert verify_account_proof(signed, CHALLENGE, DAPP, ORIGIN, no_owner_keys) == signed["address"]
+
+def test_proof_rejected_for_other_account():
+    victim = ed25519_proof()["address"]
+    signed = ed25519_proof(address=victim)
+    with pytest.raises(RolaError):
+        verify_account_proof(signed, CHALLENGE, DAPP, ORIGIN, no_owner_keys)
+
+def test_proof_rejected_for_wrong_challenge_or_origin():
+    with pytest.raises(RolaError):
+        verify_account_proof(ed25519_proof(), "cd" * 32, DAPP, ORIGIN, no_owner_keys)
+    with pytest.raises(RolaError):
+        verify_account_proof(ed25519_proof(), None, DAPP, ORIGIN, no_owner_keys)
+    with pytest.raises(RolaError):
+        verify_account_proof(ed25519_proof(origin="https://evil.example"), CHALLENGE, DAPP, ORIGIN,
+                             no_owner_keys)
+
+def test_owner_keys_metadata_takes_precedence():
+    signed = ed25519_proof(address="account_rdx1securified")
+    key_hash = rola.public_key_hash(bytes.fromhex(signed["proof"]["publicKey"])).hex()
+    owners = lambda address: {("EddsaEd25519", key_hash)}
+    assert verify_account_proof(signed, CHALLENGE, DAPP, ORIGIN, owners) == "account_rdx1securified"
+    with pytest.raises(RolaError):
+        verify_account_proof(signed, CHALLENGE, DAPP, ORIGIN, lambda address: {("EddsaEd25519", "00")})
+
+@pytest.fixture
+def client(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(storage, "_memory_db", storage.MemoryDatabase())
+    monkeypatch.setattr(rola, "fetch_owner_key_hashes", no_owner_keys)
+    fetcher = staking.StaticFetcher()
+    monkeypatch.setattr(staking, "_service", staking.StakedBalanceService(fetcher))
+    monkeypatch.setitem(app_module.app.config, "SESSION_COOKIE_SECURE", False)
+
+    with storage.open_storage() as store:
+        store.create_user(1, "Ann")
+        store.create_user(2, "Bob")
+        mid = store.add_machine(1, "incubator", 0, 0, last_activated=1)
+        store.commit()
+
+    c = app_module.app.test_client()
+    with c.session_transaction() as s:
+        s["telegram_id"] = "1"
+    c.fetcher = fetcher
+    c.incubator = mid
+    return c
+
+def _bind(c, key=None):
+    challenge = c.get("/api/rola/challenge").get_json()["challenge"]
+    signed = ed25519_proof(challenge=challenge, key=key)
+    return signed, c.post("/api/bindWallet", json=signed)
+
+def test_incubator_uses_bound_account_only(client):
+    whale = ed25519_proof()["address"]
+    client.fetcher.balances[whale] = 5000
+
+    resp = client.post("/api/activateMachine", json={"machineId": client.incubator, "accountAddress": whale})
+    assert resp.status_code == 400
+    assert client.get("/api/stakedCvx", query_string={"address": whale}).status_code == 400
+
+    signed, resp = _bind(client)
+    assert resp.status_code == 200
+    client.fetcher.balances[signed["address"]] = 250
+
+    resp = client.post("/api/activateMachine", json={"machineId": client.incubator, "accountAddress": whale})
+    assert resp.status_code == 200
+    assert resp.get_json()["reward"] == 2
+    assert client.get("/api/stakedCvx").get_json() == {"address": signed["address"], "stakedCvx": 250.0}
+    assert client.get("/api/whoami").get_json()["radixAccount"] == signed["address"]
+
+def test_bind_requires_fresh_challenge(client):
+    challenge = client.get("/api/rola/challenge").get_json()["challenge"]
+    signed = ed25519_proof(challenge=challenge)
+    assert client.post("/api/bindWallet", json=signed).status_code == 200
+    # The challenge was used up.
+    assert client.post("/api/bindWallet", json=signed).status_code == 400
+
+def test_account_bound_to_one_player(client):
+    key = ed25519.Ed25519PrivateKey.generate()
+    signed, resp = _bind(client, key)
+    assert resp.status_code == 200
+
+    # A valid proof for the same wallet, from another player's session.
+    with client.session_transaction() as s:
+        s["telegram_id"] = "2"
+    again, resp = _bind(client, key)
+    assert again["address"] == signed["address"]
+    assert resp.status_code == 409
+    assert client.get("/api/whoami").get_json()["radixAccount"] is None
+
+    # The owner can prove it again without tripping the check.
+    with client.session_transaction() as s:
+        s["telegram_id"] = "1"
+    assert _bind(client, key)[1].status_code == 200